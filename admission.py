@@ -0,0 +1,201 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import Dict, Hashable, Optional
+from config import Config
+from logger import LOGGER
+from scheduler import scheduler
+
+
+class Overloaded(Exception):
+    """No stream slot could be granted; the client should retry later"""
+    
+    def __init__(self, retry_after: int):
+        super().__init__(f"Overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A granted stream slot on one worker, released exactly once"""
+    
+    def __init__(self, controller: "AdmissionController", index: int):
+        self.controller = controller
+        self.index = index
+        self.released = False
+        self.suspended = False
+
+    def move(self, index: int) -> None:
+        """Carry the slot over to another worker after a failover"""
+        if self.released or index == self.index:
+            return
+        self.controller.active[self.index] -= 1
+        self.controller.active[index] = self.controller.active.get(index, 0) + 1
+        self.index = index
+        self.controller.dispatch()
+
+    def suspend(self) -> None:
+        """
+        Give the slot back while the client isn't reading
+        The stream is then counted as stalled instead of active
+        """
+        if self.released or self.suspended:
+            return
+        self.suspended = True
+        self.controller.active[self.index] -= 1
+        self.controller.stalled += 1
+        self.controller.dispatch()
+
+    def resume(self) -> None:
+        """Retake the slot for a stalled stream, without queueing behind new requests"""
+        if self.released or not self.suspended:
+            return
+        self.suspended = False
+        self.controller.stalled -= 1
+        self.controller.active[self.index] = self.controller.active.get(self.index, 0) + 1
+
+    def release(self) -> None:
+        if self.released:
+            return
+        self.released = True
+        if self.suspended:
+            self.controller.stalled -= 1
+            return
+        self.controller.active[self.index] -= 1
+        self.controller.dispatch()
+
+
+class AdmissionController:
+    """
+    Limits concurrent streams per worker
+    Requests over the limit wait in a bounded queue with one FIFO per client
+    (IP or link); the queues are served round-robin so one busy client can't
+    starve the others. A client may hold at most per_key queued requests, and
+    when the whole queue is full the busiest client's newest request makes
+    way for a quieter one. A full queue or a long wait fails fast with Overloaded
+    """
+    
+    def __init__(self, per_worker: int, max_queue: int, max_wait: float, retry_after: int, per_key: int = 0):
+        self.per_worker = per_worker
+        self.max_queue = max_queue
+        self.per_key = per_key
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.active: Dict[int, int] = {}
+        self.queues: "OrderedDict[Hashable, deque]" = OrderedDict()
+        self.queued = 0
+        self.stalled = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_worker > 0
+
+    def _free_worker(self, dc_id: Optional[int]) -> Optional[int]:
+        """Best ranked worker that still has a free slot"""
+        for index in scheduler.rank(dc_id):
+            if not self.enabled or self.active.get(index, 0) < self.per_worker:
+                return index
+        return None
+
+    def _grant(self, index: int) -> Ticket:
+        self.active[index] = self.active.get(index, 0) + 1
+        self.admitted += 1
+        return Ticket(self, index)
+
+    async def admit(self, key: Hashable, dc_id: Optional[int] = None) -> Ticket:
+        """Grant a stream slot now, or wait in this client's queue for one"""
+        if not self.queued:
+            index = self._free_worker(dc_id)
+            if index is not None:
+                return self._grant(index)
+        
+        waiting = len(self.queues.get(key, ()))
+        if self.per_key and waiting >= self.per_key:
+            self.rejected += 1
+            raise Overloaded(self.retry_after)
+        if self.queued >= self.max_queue and not self._shed(waiting):
+            self.rejected += 1
+            raise Overloaded(self.retry_after)
+        
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, dc_id)
+        self.queues.setdefault(key, deque()).append(entry)
+        self.queued += 1
+        
+        try:
+            return await asyncio.wait_for(future, self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                future.result().release()
+            self._remove(key, entry)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.rejected += 1
+            LOGGER.warning(f"🚦 Stream for {key} waited {self.max_wait}s without a free slot")
+            raise Overloaded(self.retry_after)
+
+    def _shed(self, waiting: int) -> bool:
+        """
+        Make room in a full queue by rejecting the newest request of the
+        client with the most queued, if it has more than the newcomer would
+        """
+        if not self.queues:
+            return False
+        key, waiters = max(self.queues.items(), key=lambda item: len(item[1]))
+        if len(waiters) <= waiting + 1:
+            return False
+        entry = waiters[-1]
+        self._remove(key, entry)
+        self.rejected += 1
+        future = entry[0]
+        if not future.done():
+            future.set_exception(Overloaded(self.retry_after))
+        return True
+
+    def _remove(self, key: Hashable, entry: tuple) -> None:
+        waiters = self.queues.get(key)
+        if waiters is None or entry not in waiters:
+            return
+        waiters.remove(entry)
+        self.queued -= 1
+        if not waiters:
+            del self.queues[key]
+
+    def dispatch(self) -> None:
+        """Hand free slots to queued requests, one client at a time"""
+        while self.queues:
+            key, waiters = next(iter(self.queues.items()))
+            future, dc_id = waiters[0]
+            if not future.done():
+                index = self._free_worker(dc_id)
+                if index is None:
+                    return
+            
+            waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self.queues.move_to_end(key)
+            else:
+                del self.queues[key]
+            
+            if not future.done():
+                future.set_result(self._grant(index))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": sum(self.active.values()),
+            "stalled": self.stalled,
+            "queued": self.queued,
+            "clients_waiting": len(self.queues),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+admission = AdmissionController(
+    Config.STREAMS_PER_WORKER,
+    Config.ADMISSION_QUEUE,
+    Config.ADMISSION_TIMEOUT,
+    Config.RETRY_AFTER,
+    Config.ADMISSION_QUEUE_PER_CLIENT,
+)
@@ -0,0 +1,131 @@
+import time
+import asyncio
+from typing import Callable, Optional, Set
+from config import Config
+from logger import LOGGER
+
+
+class StreamWatch:
+    """
+    Follows one response body as the client drains it
+    The time the body spends suspended at ``yield`` is the time the client
+    took to take the previous chunk, which gives its drain rate and tells
+    when it has stalled
+    """
+    
+    EWMA_ALPHA = 0.3
+    
+    def __init__(self, ticket, disconnect: Optional[Callable[[], bool]] = None):
+        self.ticket = ticket
+        self.disconnect = disconnect  # closes the client's connection; False if it can't
+        self.body = None
+        self.closing: Optional[asyncio.Task] = None
+        self.waiting_since: Optional[float] = None
+        self.drain_rate = 0.0  # EWMA of bytes/s taken by the client
+        self.stalled = False
+        self.aborted = False
+
+    def before_yield(self) -> None:
+        self.waiting_since = time.monotonic()
+
+    def after_yield(self, size: int) -> bool:
+        """Record how fast the chunk was taken; True if the stream stalled meanwhile"""
+        waited = max(time.monotonic() - self.waiting_since, 1e-6)
+        self.waiting_since = None
+        rate = size / waited
+        self.drain_rate = rate if not self.drain_rate else self.drain_rate + self.EWMA_ALPHA * (rate - self.drain_rate)
+        return self.stalled
+
+    def window_cap(self, chunk_size: int) -> int:
+        """
+        Parts a stream may keep in flight or buffered
+        Enough for STREAM_BUFFER_SECONDS of the client's drain rate, never more
+        than STREAM_MAX_BUFFER; fast clients are limited by the worker window instead
+        """
+        if not self.drain_rate:
+            budget = Config.STREAM_MAX_BUFFER * 1024 * 1024
+        else:
+            budget = min(Config.STREAM_MAX_BUFFER * 1024 * 1024, self.drain_rate * Config.STREAM_BUFFER_SECONDS)
+        return max(1, int(budget // chunk_size))
+
+    def stall(self) -> None:
+        """Free the worker side of a stream whose client stopped reading"""
+        if self.stalled:
+            return
+        self.stalled = True
+        self.ticket.suspend()
+        if self.body is not None:
+            self.closing = asyncio.create_task(self.body.aclose())
+
+    async def resume(self) -> None:
+        """The client is reading again; wait for the old body to close and retake the slot"""
+        if self.closing is not None:
+            await asyncio.gather(self.closing, return_exceptions=True)
+            self.closing = None
+        self.stalled = False
+        self.ticket.resume()
+
+    async def close(self) -> None:
+        """Close the current body so its worker slot and read-ahead are freed right away"""
+        if self.closing is not None:
+            await asyncio.gather(self.closing, return_exceptions=True)
+        elif self.body is not None:
+            await self.body.aclose()
+
+    def abort(self) -> bool:
+        """
+        Close the connection of a client that has been idle too long
+        The server then sees an ordinary disconnect and the body ends at its
+        next step; if the connection can't be closed the stream just stays
+        stalled, ready to resume
+        """
+        self.stall()
+        disconnect, self.disconnect = self.disconnect, None
+        self.aborted = bool(disconnect and disconnect())
+        return self.aborted
+
+
+class StreamMonitor:
+    """Periodically checks every open stream for stalled or idle clients"""
+    
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.streams: Set[StreamWatch] = set()
+        self.stalls = 0
+        self.aborts = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def watch(self, ticket, disconnect: Optional[Callable[[], bool]] = None) -> StreamWatch:
+        watch = StreamWatch(ticket, disconnect)
+        self.streams.add(watch)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return watch
+
+    def unwatch(self, watch: StreamWatch) -> None:
+        self.streams.discard(watch)
+
+    @property
+    def stalled(self) -> int:
+        return sum(1 for watch in self.streams if watch.stalled)
+
+    async def _run(self) -> None:
+        while self.streams:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            for watch in list(self.streams):
+                if watch.waiting_since is None:
+                    continue
+                idle = now - watch.waiting_since
+                if idle > Config.STREAM_IDLE_TIMEOUT and watch.disconnect is not None:
+                    if watch.abort():
+                        LOGGER.info(f"💤 Closed connection idle for {int(idle)}s on worker {watch.ticket.index}")
+                        self.aborts += 1
+                        self.unwatch(watch)
+                elif idle > Config.STREAM_STALL_TIMEOUT and not watch.stalled:
+                    LOGGER.debug(f"Stream on worker {watch.ticket.index} stalled for {int(idle)}s, freeing its slot")
+                    self.stalls += 1
+                    watch.stall()
+
+
+monitor = StreamMonitor()
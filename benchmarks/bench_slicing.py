@@ -0,0 +1,94 @@
+"""
+Benchmark: copying vs zero-copy trimming of range parts
+
+Replays range-heavy traffic (random seeks, each range trimmed at both ends)
+through the old bytes-slicing trim and the memoryview-based ``slice_part``,
+and reports CPU time and bytes allocated per GB served
+
+Usage: python benchmarks/bench_slicing.py [GB]
+"""
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from byte_streamer import MAX_CHUNK_SIZE, slice_part
+
+GB = 1024 ** 3
+
+
+def slice_part_copy(chunk, start, end):
+    """The previous trim, which slices (and copies) the bytes object"""
+    if start == 0 and end >= len(chunk):
+        return chunk
+    return chunk[start:end]
+
+
+def make_requests(total_bytes, seed=42):
+    """Random ranges of 64KB-8MB, like a player seeking through a video"""
+    rng = random.Random(seed)
+    requests, served = [], 0
+    while served < total_bytes:
+        length = rng.choice([64 * 1024, 512 * 1024, 2 * MAX_CHUNK_SIZE, 8 * MAX_CHUNK_SIZE])
+        from_bytes = rng.randrange(0, 4 * GB - length)
+        until_bytes = from_bytes + length - 1
+        offset = from_bytes - from_bytes % MAX_CHUNK_SIZE
+        requests.append([
+            (max(from_bytes - part, 0), min(until_bytes - part + 1, MAX_CHUNK_SIZE))
+            for part in range(offset, until_bytes + 1, MAX_CHUNK_SIZE)
+        ])
+        served += length
+    return requests, served
+
+
+def run(trim, requests, chunk):
+    """Trim every part of every request and hand it to a sink, like the ASGI send"""
+    served = 0
+    for slices in requests:
+        for start, end in slices:
+            served += len(trim(chunk, start, end))
+    return served
+
+
+def measure(trim, requests, chunk):
+    start = time.process_time()
+    served = run(trim, requests, chunk)
+    cpu = time.process_time() - start
+    
+    # Allocation pass: sum the sizes of every object the trim creates
+    tracemalloc.start()
+    allocated = 0
+    for slices in requests:
+        for start, end in slices:
+            before = tracemalloc.get_traced_memory()[0]
+            part = trim(chunk, start, end)
+            allocated += tracemalloc.get_traced_memory()[0] - before
+            del part
+    tracemalloc.stop()
+    return served, cpu, allocated
+
+
+def main():
+    total_gb = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    requests, total = make_requests(int(total_gb * GB))
+    chunk = os.urandom(MAX_CHUNK_SIZE)
+    
+    print(f"{len(requests)} range requests, {total / GB:.2f} GB served")
+    print(f"{'trim':<12}{'CPU s/GB':>12}{'alloc MB/GB':>14}")
+    results = {}
+    for name, trim in (("bytes", slice_part_copy), ("memoryview", slice_part)):
+        served, cpu, allocated = measure(trim, requests, chunk)
+        per_gb = served / GB
+        results[name] = (cpu / per_gb, allocated / per_gb / (1024 * 1024))
+        print(f"{name:<12}{results[name][0]:>12.4f}{results[name][1]:>14.2f}")
+    
+    old, new = results["bytes"], results["memoryview"]
+    print(f"CPU reduction: {(1 - new[0] / old[0]) * 100:.1f}%, "
+          f"allocation reduction: {(1 - new[1] / old[1]) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
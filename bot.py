@@ -1,8 +1,9 @@
 from pyrogram import Client
 from config import Config
 from logger import LOGGER
-from asyncio import gather, create_task
+from asyncio import Event, gather, create_task
 from os import environ
+import time
 
 # Main bot - handles user interactions
 MainBot = Client(
@@ -20,6 +21,54 @@ MainBot = Client(
 WorkerBots = {}
 WorkLoads = {}
 
+
+class Startup:
+    """
+    Bootstrap progress and timings
+    The HTTP server is up before any bot; requests that need a worker wait
+    for first_worker, and later workers join the pool as they come up
+    """
+    
+    def __init__(self):
+        self.began = time.monotonic()
+        self.events = {}
+        self.first_worker = Event()
+        self.finished = False
+    
+    @property
+    def ready(self) -> bool:
+        return self.first_worker.is_set()
+    
+    def mark(self, event: str) -> float:
+        """Record and log how long after startup an event happened"""
+        elapsed = time.monotonic() - self.began
+        self.events.setdefault(event, elapsed)
+        LOGGER.info(f"⏱️ {event} after {elapsed:.2f}s")
+        return elapsed
+    
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "finished": self.finished,
+            "uptime": round(time.monotonic() - self.began, 2),
+            "events": {event: round(elapsed, 2) for event, elapsed in self.events.items()},
+        }
+
+
+startup = Startup()
+
+
+def add_worker(client_id, client):
+    """Put a started client into rotation and hand it any queued streams"""
+    WorkLoads.setdefault(client_id, 0)
+    WorkerBots[client_id] = client
+    if not startup.ready:
+        startup.mark(f"First worker ready (worker {client_id})")
+        startup.first_worker.set()
+    
+    from admission import admission
+    admission.dispatch()
+
 class TokenParser:
     """Parse worker bot tokens from environment or config"""
     @staticmethod
@@ -47,7 +96,7 @@ class TokenParser:
         return tokens
 
 async def start_client(client_id, token):
-    """Start a single worker bot client"""
+    """Start a single worker bot client and add it to the pool as soon as it is up"""
     try:
         LOGGER.info(f"Starting Worker Bot {client_id}...")
         client = await Client(
@@ -59,26 +108,50 @@ async def start_client(client_id, token):
             no_updates=True,
             in_memory=True
         ).start()
-        WorkLoads[client_id] = 0
+        add_worker(client_id, client)
         LOGGER.info(f"✅ Worker Bot {client_id} started: @{client.me.username}")
         return client_id, client
     except Exception as e:
         LOGGER.error(f"❌ Failed to start Worker Bot {client_id}: {e}", exc_info=True)
         return None
 
+def count_bots():
+    """The main bot plus every configured worker bot, across all nodes"""
+    return 1 + len(TokenParser.parse_from_config() or TokenParser.parse_from_env())
+
+def owns_worker(client_id):
+    """Whether this node runs the given worker; node 0 always has the main bot"""
+    return client_id % Config.NODE_COUNT == Config.NODE_INDEX
+
+async def start_main_bot():
+    """Start the main bot; it also streams as worker 0"""
+    LOGGER.info("Starting main bot...")
+    await MainBot.start()
+    MainBot.username = MainBot.me.username
+    add_worker(0, MainBot)
+    LOGGER.info(f"✅ Main Bot: @{MainBot.username}")
+
 async def initialize_workers():
-    """Initialize all worker bot clients with load balancing"""
-    # MainBot is worker 0
-    WorkerBots[0] = MainBot
-    WorkLoads[0] = 0
-    
+    """
+    Start the worker bot clients owned by this node, all at once
+    Each one serves streams as soon as it is up, without waiting for the rest
+    """
     # Get tokens from config or environment
     all_tokens = TokenParser.parse_from_config()
     if not all_tokens:
         all_tokens = TokenParser.parse_from_env()
     
+    # With several nodes each one starts only its share of the workers
+    all_tokens = {i: token for i, token in all_tokens.items() if owns_worker(i)}
+    if Config.NODE_COUNT > 1:
+        main_bot = [0] if owns_worker(0) else []
+        LOGGER.info(f"🧩 Node {Config.NODE_INDEX} of {Config.NODE_COUNT} owns workers: {sorted([*main_bot, *all_tokens])}")
+    
     if not all_tokens:
-        LOGGER.info("⚠️  No additional worker bots found, using only main bot for streaming")
+        if owns_worker(0):
+            LOGGER.info("⚠️  No additional worker bots found, using only main bot for streaming")
+        else:
+            LOGGER.warning("⚠️  This node owns no worker bots and can't serve streams")
         return
     
     LOGGER.info(f"🔄 Initializing {len(all_tokens)} worker bots...")
@@ -86,18 +159,14 @@ async def initialize_workers():
     # Start all worker bots concurrently
     tasks = [create_task(start_client(i, token)) for i, token in all_tokens.items()]
     clients = await gather(*tasks)
+    started = [client for client in clients if client]
     
-    # Filter out failed clients
-    clients = {client_id: client for client_id, client in clients if client}
-    WorkerBots.update(clients)
-    
-    if len(WorkerBots) > 1:
-        LOGGER.info(f"🚀 Multi-Client Mode Enabled with {len(WorkerBots)} total bots")
+    if started:
+        LOGGER.info(f"🚀 Multi-Client Mode Enabled with {len(started)}/{len(all_tokens)} worker bots")
     else:
         LOGGER.info("⚠️  No additional worker bots initialized, using only main bot")
 
-def get_least_loaded_bot():
-    """Get the worker bot with least load for load balancing"""
-    if not WorkLoads:
-        return None
-    return min(WorkLoads, key=WorkLoads.get)
+def get_least_loaded_bot(dc_id=None):
+    """Get the best worker bot for a new stream (see scheduler.py)"""
+    from scheduler import scheduler
+    return scheduler.pick(dc_id)
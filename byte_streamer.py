@@ -1,11 +1,61 @@
+import time
 import asyncio
 from pyrogram import utils, raw
-from pyrogram.errors import AuthBytesInvalid
+from pyrogram.errors import AuthBytesInvalid, FileReferenceExpired, FileReferenceInvalid, FloodWait
 from pyrogram.file_id import FileId, FileType, ThumbnailSource
 from pyrogram.session import Session, Auth
-from typing import Dict, Union
+from collections import deque
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
 from pyrogram import Client
+from cache import disk_cache, file_cache, memory_cache
+from config import Config
 from logger import LOGGER
+from scheduler import scheduler
+from shared_state import shared_state
+from singleflight import SingleFlight
+
+# Concurrent lookups of the same message and fetches of the same part share one request
+metadata_flight = SingleFlight()
+chunk_flight = SingleFlight()
+reference_flight = SingleFlight()
+
+
+class WorkerUnavailable(Exception):
+    """
+    A worker failed mid-stream (FloodWait, timeout or a dead session)
+    The stream can resume from the same byte on another worker
+    """
+    
+    def __init__(self, index: int, reason: str):
+        super().__init__(f"Worker {index}: {reason}")
+        self.index = index
+        self.reason = reason
+
+# upload.GetFile limits: a power of two between 4KB and 1MB that never crosses a 1MB boundary
+MIN_CHUNK_SIZE = 4 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+
+class LazyMediaSession:
+    """
+    One stream's media session on one worker, opened on the first cache miss
+    Streams served from the caches never touch Telegram, and a part evicted
+    mid-stream still finds a session to fetch it with
+    """
+    
+    def __init__(self, streamer: "ByteStreamer", file_id: FileId):
+        self.streamer = streamer
+        self.file_id = file_id
+        self.session: Optional[Session] = None
+        self.lock = asyncio.Lock()
+    
+    async def get(self) -> Session:
+        if self.session is None:
+            async with self.lock:
+                if self.session is None:
+                    self.session = await self.streamer.open_media_session(self.file_id)
+        return self.session
+
 
 class ByteStreamer:
     """
@@ -13,20 +63,42 @@ class ByteStreamer:
     Same algorithm as Telegram-Stremio
     """
     
-    def __init__(self, client: Client):
-        self.clean_timer = 30 * 60  # 30 minutes
+    def __init__(self, client: Client, index: int):
         self.client: Client = client
-        self.__cached_file_ids: Dict[int, FileId] = {}
-        asyncio.create_task(self.clean_cache())
+        self.index = index
+        self.inflight = asyncio.Semaphore(Config.WORKER_MAX_INFLIGHT)
+        self.media_pools: Dict[int, List[Session]] = {}
+        self.session_locks: Dict[int, asyncio.Lock] = {}
+        self.pool_cursors: Dict[int, int] = {}
 
     async def get_file_properties(self, chat_id: int, message_id: int) -> FileId:
         """Get or cache file properties from a message"""
-        if message_id not in self.__cached_file_ids:
-            file_id = await self._get_file_ids(chat_id, message_id)
-            if not file_id:
-                raise Exception(f'Message with ID {message_id} not found!')
-            self.__cached_file_ids[message_id] = file_id
-        return self.__cached_file_ids[message_id]
+        file_id = file_cache.get((chat_id, message_id))
+        if file_id is None:
+            file_id = await metadata_flight.do(
+                (chat_id, message_id), lambda: self._load_file_properties(chat_id, message_id)
+            )
+        return file_id
+
+    async def _load_file_properties(self, chat_id: int, message_id: int, use_shared: bool = True) -> FileId:
+        """
+        Look a message up and store its file properties in the shared cache
+        Other nodes' lookups are reused from the shared state when available
+        """
+        if use_shared:
+            file_id = await load_shared_file_properties(chat_id, message_id)
+            if file_id is not None:
+                return file_id
+        
+        file_id = await self._get_file_ids(chat_id, message_id)
+        if not file_id:
+            raise Exception(f'Message with ID {message_id} not found!')
+        file_cache.set((chat_id, message_id), file_id)
+        try:
+            await shared_state.set_file(f"{chat_id}:{message_id}", dump_file_id(file_id), Config.FILE_CACHE_TTL)
+        except Exception as e:
+            LOGGER.warning(f"⚠️ Could not share properties of message {message_id}: {e}")
+        return file_id
 
     async def _get_file_ids(self, chat_id: int, message_id: int) -> FileId:
         """Extract file ID from message"""
@@ -49,6 +121,7 @@ class ByteStreamer:
             setattr(file_id_obj, 'file_size', getattr(media, 'file_size', 0))
             setattr(file_id_obj, 'mime_type', getattr(media, 'mime_type', ''))
             setattr(file_id_obj, 'unique_id', file_unique_id)
+            setattr(file_id_obj, 'message_ref', (chat_id, message_id))
             
             return file_id_obj
         except Exception as e:
@@ -59,118 +132,272 @@ class ByteStreamer:
         self, 
         file_id: FileId, 
         index: int, 
-        offset: int, 
-        first_part_cut: int, 
-        last_part_cut: int, 
-        part_count: int, 
-        chunk_size: int
+        parts: List[int], 
+        slices: List[Tuple[int, int, int]], 
+        chunk_size: int,
+        window_cap: Optional[Callable[[int], int]] = None
     ):
         """
         Stream file chunks from Telegram
-        Supports byte-range requests for seeking/resuming
+        Fetches the parts of a plan from ``plan_ranges`` and yields its slices,
+        so one or several byte ranges share a single pipeline of fetches
+        Keeps up to READ_AHEAD GetFile requests in flight and yields them in order;
+        ``window_cap`` can lower that to what a slow client is able to drain
         """
         from bot import WorkLoads
         
         client = self.client
         WorkLoads[index] += 1
-        
-        media_session = await self.generate_media_session(client, file_id)
-        current_part = 1
-        location = await self.get_location(file_id)
+        sent = 0
         
         try:
-            r = await media_session.send(
-                raw.functions.upload.GetFile(location=location, offset=offset, limit=chunk_size)
-            )
+            media_session = LazyMediaSession(self, file_id)
+            location = await self.get_location(file_id)
             
-            if isinstance(r, raw.types.upload.File):
-                while True:
-                    chunk = r.bytes
-                    if not chunk:
-                        break
-                    
-                    # Handle different parts of the range request
-                    if part_count == 1:
-                        yield chunk[first_part_cut:last_part_cut]
-                    elif current_part == 1:
-                        yield chunk[first_part_cut:]
-                    elif current_part == part_count:
-                        yield chunk[:last_part_cut]
-                    else:
-                        yield chunk
-
-                    current_part += 1
-                    offset += chunk_size
-
-                    if current_part > part_count:
-                        break
-                    
-                    # Request next chunk
-                    r = await media_session.send(
-                        raw.functions.upload.GetFile(
-                            location=location, offset=offset, limit=chunk_size
-                        ),
-                    )
-            else:
-                LOGGER.error(f"❌ Unexpected response type: {type(r)}")
+            async def fetch(part_offset: int) -> bytes:
+                return await self.fetch_part(file_id, media_session, location, part_offset, chunk_size)
+            
+            def window() -> int:
+                limit = self.read_ahead_window(index)
+                return min(limit, window_cap(chunk_size)) if window_cap else limit
+            
+            async for chunk in yield_slices(read_ahead(fetch, parts, window), slices):
+                yield chunk
+                sent += 1
                 
-        except (TimeoutError, AttributeError):
-            pass
+        except WorkerUnavailable:
+            # Let the caller resume the stream on another worker
+            raise
         except Exception as e:
             LOGGER.error(f"❌ Unexpected stream error: {e}", exc_info=True)
         finally:
-            LOGGER.debug(f"Finished yielding file with {current_part-1} parts.")
+            LOGGER.debug(f"Finished yielding file with {sent} slices of {len(parts)} parts.")
             WorkLoads[index] -= 1
 
+    async def open_media_session(self, file_id: FileId) -> Session:
+        """Get a media session for the file's DC, failing over if it can't be set up"""
+        try:
+            media_session = await self.generate_media_session(self.client, file_id)
+        except (TimeoutError, asyncio.TimeoutError, OSError) as e:
+            media_session = None
+            LOGGER.error(f"❌ Media session for DC {file_id.dc_id} failed on worker {self.index}: {e}")
+        if media_session is None:
+            scheduler.cooldown(self.index, Config.WORKER_ERROR_COOLDOWN, f"no media session for DC {file_id.dc_id}")
+            raise WorkerUnavailable(self.index, f"no media session for DC {file_id.dc_id}")
+        return media_session
+
+    async def fetch_part(self, file_id: FileId, media_session: LazyMediaSession, location, offset: int, limit: int) -> bytes:
+        """
+        Fetch a part from the memory or disk cache, or from Telegram on a miss
+        Concurrent fetches of the same part share one request
+        """
+        chunk = memory_cache.get(file_id.unique_id, offset, limit)
+        if chunk is not None:
+            return chunk
+        chunk = await disk_cache.get(file_id.unique_id, offset, limit)
+        if chunk is not None:
+            memory_cache.put(file_id.unique_id, offset, limit, chunk)
+            return chunk
+        return await chunk_flight.do(
+            (file_id.unique_id, offset, limit),
+            lambda: self._download_part(file_id, media_session, location, offset, limit)
+        )
+
+    async def _download_part(self, file_id: FileId, media_session: LazyMediaSession, location, offset: int, limit: int) -> bytes:
+        """Fetch a part from Telegram and keep a copy in memory and on disk"""
+        session = await media_session.get()
+        # Other parts may refresh the shared location while this one is in flight
+        sent_reference = location.file_reference
+        try:
+            chunk = await self._fetch_part(session, location, offset, limit)
+        except (FileReferenceExpired, FileReferenceInvalid):
+            if not getattr(file_id, 'message_ref', None):
+                raise
+            await self.refresh_file_reference(file_id, location, sent_reference)
+            chunk = await self._fetch_part(session, location, offset, limit)
+        memory_cache.put(file_id.unique_id, offset, limit, chunk)
+        disk_cache.put(file_id.unique_id, offset, limit, chunk)
+        return chunk
+
+    async def _fetch_part(self, media_session: Session, location, offset: int, limit: int) -> bytes:
+        """Fetch a single part, bounded by the worker-wide in-flight limit"""
+        async with self.inflight:
+            started = time.monotonic()
+            try:
+                r = await media_session.send(
+                    raw.functions.upload.GetFile(location=location, offset=offset, limit=limit)
+                )
+            except FloodWait as e:
+                scheduler.record_flood_wait(self.index, e.value)
+                raise WorkerUnavailable(self.index, f"FloodWait of {e.value}s") from e
+            except (FileReferenceExpired, FileReferenceInvalid):
+                # Not the worker's fault; the caller refreshes the reference
+                raise
+            except (TimeoutError, asyncio.TimeoutError) as e:
+                scheduler.cooldown(self.index, Config.WORKER_ERROR_COOLDOWN, "GetFile timed out")
+                raise WorkerUnavailable(self.index, "GetFile timed out") from e
+            except OSError as e:
+                # The connection is gone; drop the session so it gets rebuilt
+                self.discard_media_session(media_session)
+                scheduler.cooldown(self.index, Config.WORKER_ERROR_COOLDOWN, f"media session died: {e}")
+                raise WorkerUnavailable(self.index, f"media session died: {e}") from e
+            except Exception:
+                scheduler.record_error(self.index)
+                raise
+        if not isinstance(r, raw.types.upload.File):
+            LOGGER.error(f"❌ Unexpected response type: {type(r)}")
+            scheduler.record_error(self.index)
+            return b""
+        scheduler.record_fetch(self.index, len(r.bytes), time.monotonic() - started)
+        return r.bytes
+
+    async def refresh_file_reference(self, file_id: FileId, location, stale_reference: bytes) -> None:
+        """
+        Swap a fresh file reference into a file ID and an in-flight location
+        stale_reference is the one Telegram refused; if the file ID has moved
+        on since, it is reused. Otherwise the message is fetched again once,
+        shared by every stream waiting on it, and the new file ID replaces the
+        old one in the file cache
+        """
+        if file_id.file_reference == stale_reference:
+            fresh = await reference_flight.do(
+                file_id.message_ref, lambda: self._reload_file_properties(*file_id.message_ref)
+            )
+            file_id.file_reference = fresh.file_reference
+        location.file_reference = file_id.file_reference
+
+    async def _reload_file_properties(self, chat_id: int, message_id: int) -> FileId:
+        LOGGER.info(f"🔄 File reference expired for message {message_id}, refreshing")
+        return await self._load_file_properties(chat_id, message_id, use_shared=False)
+
+    def discard_media_session(self, media_session: Session) -> None:
+        """Forget a dead media session and stop it in the background"""
+        for dc_id, pool in self.media_pools.items():
+            if media_session in pool:
+                pool.remove(media_session)
+                if self.client.media_sessions.get(dc_id) is media_session:
+                    if pool:
+                        self.client.media_sessions[dc_id] = pool[0]
+                    else:
+                        del self.client.media_sessions[dc_id]
+                asyncio.create_task(media_session.stop())
+                return
+
+    def read_ahead_window(self, index: int) -> int:
+        """
+        Read-ahead window for one stream on this worker
+        The worker's in-flight budget is shared between its active streams
+        so one large download can't starve the others
+        """
+        from bot import WorkLoads
+        
+        streams = max(1, WorkLoads.get(index, 1))
+        return max(1, min(Config.READ_AHEAD, Config.WORKER_MAX_INFLIGHT // streams))
+
     async def generate_media_session(self, client: Client, file_id: FileId) -> Session:
-        """Generate or get cached media session for a specific DC"""
-        media_session = client.media_sessions.get(file_id.dc_id, None)
+        """
+        Get a media session for a specific DC from this worker's pool
+        Only one handshake per DC runs at a time; the pool then grows to
+        MEDIA_SESSIONS_PER_DC connections that share the authorized key
+        """
+        return await self.media_session_for_dc(client, file_id.dc_id)
+
+    async def media_session_for_dc(self, client: Client, dc_id: int) -> Optional[Session]:
+        """Pooled media session for a DC, opening a new one while the pool isn't full"""
+        pool = self.media_pools.setdefault(dc_id, [])
+        if not pool and client.media_sessions.get(dc_id):
+            # Adopt a session Pyrogram already opened
+            pool.append(client.media_sessions[dc_id])
         
-        if media_session is None:
-            if file_id.dc_id != await client.storage.dc_id():
-                media_session = Session(
-                    client,
-                    file_id.dc_id,
-                    await Auth(client, file_id.dc_id, await client.storage.test_mode()).create(),
-                    await client.storage.test_mode(),
-                    is_media=True,
+        if len(pool) < Config.MEDIA_SESSIONS_PER_DC:
+            lock = self.session_locks.setdefault(dc_id, asyncio.Lock())
+            async with lock:
+                if len(pool) < Config.MEDIA_SESSIONS_PER_DC:
+                    auth_key = pool[0].auth_key if pool else None
+                    media_session = await self._create_media_session(client, dc_id, auth_key)
+                    if media_session is not None:
+                        pool.append(media_session)
+                        client.media_sessions.setdefault(dc_id, media_session)
+                        LOGGER.debug(f"Created media session {len(pool)} for DC {dc_id}")
+                        return media_session
+        
+        if not pool:
+            return None
+        
+        # Spread streams over the pooled connections
+        cursor = self.pool_cursors.get(dc_id, 0)
+        self.pool_cursors[dc_id] = cursor + 1
+        LOGGER.debug(f"Using cached media session for DC {dc_id}")
+        return pool[cursor % len(pool)]
+
+    async def warm_media_sessions(self, dc_id: int) -> int:
+        """
+        Fill this worker's pool for a DC, replacing sessions that have stopped
+        Returns the number of live sessions
+        """
+        for media_session in list(self.media_pools.get(dc_id, [])):
+            if not media_session.is_started.is_set():
+                LOGGER.info(f"♻️ Worker {self.index}: media session for DC {dc_id} dropped, reconnecting")
+                self.discard_media_session(media_session)
+        
+        pool = self.media_pools.setdefault(dc_id, [])
+        while len(pool) < Config.MEDIA_SESSIONS_PER_DC:
+            before = len(pool)
+            await self.media_session_for_dc(self.client, dc_id)
+            if len(pool) == before:
+                break
+        return len(pool)
+
+    async def _create_media_session(self, client: Client, dc_id: int, auth_key: Optional[bytes] = None) -> Optional[Session]:
+        """
+        Open a new media session for a DC
+        Without an already authorized ``auth_key`` a foreign DC needs a new key
+        and an exported authorization
+        """
+        test_mode = await client.storage.test_mode()
+        
+        if auth_key is not None:
+            media_session = Session(client, dc_id, auth_key, test_mode, is_media=True)
+            await media_session.start()
+        elif dc_id != await client.storage.dc_id():
+            media_session = Session(
+                client,
+                dc_id,
+                await Auth(client, dc_id, test_mode).create(),
+                test_mode,
+                is_media=True,
+            )
+            await media_session.start()
+            
+            for _ in range(6):
+                exported_auth = await client.invoke(
+                    raw.functions.auth.ExportAuthorization(dc_id=dc_id)
                 )
-                await media_session.start()
-                
-                for _ in range(6):
-                    exported_auth = await client.invoke(
-                        raw.functions.auth.ExportAuthorization(dc_id=file_id.dc_id)
-                    )
-                    try:
-                        await media_session.send(
-                            raw.functions.auth.ImportAuthorization(
-                                id=exported_auth.id, bytes=exported_auth.bytes
-                            )
+                try:
+                    await media_session.send(
+                        raw.functions.auth.ImportAuthorization(
+                            id=exported_auth.id, bytes=exported_auth.bytes
                         )
-                        break
-                    except AuthBytesInvalid:
-                        LOGGER.debug(f"Invalid authorization bytes for DC {file_id.dc_id}, retrying...")
-                    except OSError:
-                        LOGGER.debug(f"Connection error, retrying...")
-                        await asyncio.sleep(2)
-                else:
-                    await media_session.stop()
-                    LOGGER.error(f"Failed to establish media session for DC {file_id.dc_id}")
-                    return None
+                    )
+                    break
+                except AuthBytesInvalid:
+                    LOGGER.debug(f"Invalid authorization bytes for DC {dc_id}, retrying...")
+                except OSError:
+                    LOGGER.debug(f"Connection error, retrying...")
+                    await asyncio.sleep(2)
             else:
-                media_session = Session(
-                    client,
-                    file_id.dc_id,
-                    await client.storage.auth_key(),
-                    await client.storage.test_mode(),
-                    is_media=True,
-                )
-                await media_session.start()
-            
-            LOGGER.debug(f"Created media session for DC {file_id.dc_id}")
-            client.media_sessions[file_id.dc_id] = media_session
+                await media_session.stop()
+                LOGGER.error(f"Failed to establish media session for DC {dc_id}")
+                return None
         else:
-            LOGGER.debug(f"Using cached media session for DC {file_id.dc_id}")
+            media_session = Session(
+                client,
+                dc_id,
+                await client.storage.auth_key(),
+                test_mode,
+                is_media=True,
+            )
+            await media_session.start()
         
         return media_session
 
@@ -217,9 +444,182 @@ class ByteStreamer:
         
         return location
 
-    async def clean_cache(self) -> None:
-        """Periodically clean the file ID cache"""
-        while True:
-            await asyncio.sleep(self.clean_timer)
-            self.__cached_file_ids.clear()
-            LOGGER.debug("🧹 Cleaned the file ID cache")
+
+async def cached_file_properties(chat_id: int, message_id: int) -> Optional[FileId]:
+    """File properties already known to this node or the cluster, without asking Telegram"""
+    file_id = file_cache.get((chat_id, message_id))
+    if file_id is None:
+        file_id = await load_shared_file_properties(chat_id, message_id)
+    return file_id
+
+
+async def load_shared_file_properties(chat_id: int, message_id: int) -> Optional[FileId]:
+    """Another node's lookup from the shared state, copied into the local cache"""
+    try:
+        stored = await shared_state.get_file(f"{chat_id}:{message_id}")
+    except Exception as e:
+        LOGGER.warning(f"⚠️ Shared state lookup failed for message {message_id}: {e}")
+        return None
+    if not stored:
+        return None
+    file_id = load_file_id(stored)
+    file_cache.set((chat_id, message_id), file_id)
+    return file_id
+
+
+def dump_file_id(file_id: FileId) -> Dict[str, Union[str, int, list]]:
+    """File properties as plain JSON for the shared state"""
+    return {
+        "file_id": file_id.encode(),
+        "file_name": file_id.file_name,
+        "file_size": file_id.file_size,
+        "mime_type": file_id.mime_type,
+        "unique_id": file_id.unique_id,
+        "message_ref": list(file_id.message_ref),
+    }
+
+
+def load_file_id(data: Dict[str, Union[str, int, list]]) -> FileId:
+    file_id = FileId.decode(data["file_id"])
+    file_id.file_name = data["file_name"]
+    file_id.file_size = data["file_size"]
+    file_id.mime_type = data["mime_type"]
+    file_id.unique_id = data["unique_id"]
+    file_id.message_ref = tuple(data["message_ref"])
+    return file_id
+
+
+async def read_ahead(
+    fetch: Callable[[int], Awaitable[bytes]],
+    parts: List[int],
+    window: Callable[[], int],
+):
+    """
+    Yield the parts at the given offsets in order,
+    keeping up to ``window()`` fetches in flight at any time
+    """
+    pending = deque()
+    requested = 0
+    
+    try:
+        for _ in range(len(parts)):
+            limit = window()
+            while len(pending) < limit and requested < len(parts):
+                pending.append(asyncio.create_task(fetch(parts[requested])))
+                requested += 1
+            
+            chunk = await pending.popleft()
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def yield_slices(chunks: AsyncIterator[bytes], slices: List[Tuple[int, int, int]]):
+    """Cut fetched parts into the slices of a plan; one part may feed several slices"""
+    current, chunk = -1, b""
+    try:
+        for part, start, end in slices:
+            while current < part:
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    return
+                current += 1
+            yield slice_part(chunk, start, end)
+    finally:
+        await chunks.aclose()
+
+
+async def yield_file_striped(
+    lanes: List[Tuple[int, "ByteStreamer", FileId]],
+    parts: List[int],
+    slices: List[Tuple[int, int, int]],
+    chunk_size: int,
+    window_cap: Optional[Callable[[int], int]] = None
+):
+    """
+    Stream a plan through several workers at once
+    The parts are split into stripes of STRIPE_PARTS which are fetched
+    round-robin across the lanes and reassembled in order
+    """
+    from bot import WorkLoads
+    
+    for index, _, _ in lanes:
+        WorkLoads[index] += 1
+    sent = 0
+    
+    try:
+        fetchers = []
+        for index, streamer, file_id in lanes:
+            media_session = LazyMediaSession(streamer, file_id)
+            location = await streamer.get_location(file_id)
+            fetchers.append(partial(streamer.fetch_part, file_id, media_session, location))
+        
+        async def fetch(part_offset: int) -> bytes:
+            stripe = part_offset // chunk_size // Config.STRIPE_PARTS
+            return await fetchers[stripe % len(fetchers)](part_offset, chunk_size)
+        
+        def window() -> int:
+            limit = sum(streamer.read_ahead_window(index) for index, streamer, _ in lanes)
+            return min(limit, window_cap(chunk_size)) if window_cap else limit
+        
+        async for chunk in yield_slices(read_ahead(fetch, parts, window), slices):
+            yield chunk
+            sent += 1
+            
+    except WorkerUnavailable:
+        raise
+    except Exception as e:
+        LOGGER.error(f"❌ Unexpected striped stream error: {e}", exc_info=True)
+    finally:
+        LOGGER.debug(f"Finished yielding striped file with {sent} slices over {len(lanes)} workers.")
+        for index, _, _ in lanes:
+            WorkLoads[index] -= 1
+
+
+def choose_chunk_size(from_bytes: int, until_bytes: int) -> int:
+    """
+    Pick the GetFile limit for a range
+    Small reads (probes, MP4 moov atoms) use the valid limit that fetches the
+    fewest bytes in at most two parts; anything larger uses full 1MB parts
+    """
+    best_size, best_cost = MAX_CHUNK_SIZE, None
+    chunk_size = MIN_CHUNK_SIZE
+    while chunk_size <= MAX_CHUNK_SIZE:
+        parts = until_bytes // chunk_size - from_bytes // chunk_size + 1
+        if parts <= 2 and (best_cost is None or parts * chunk_size <= best_cost):
+            best_size, best_cost = chunk_size, parts * chunk_size
+        chunk_size *= 2
+    return best_size
+
+
+def plan_ranges(ranges: List[Tuple[int, int]], chunk_size: int) -> Tuple[List[int], List[Tuple[int, int, int]]]:
+    """
+    Parts to fetch and slices to send for sorted, non-overlapping byte ranges
+    Each part is fetched once even when several ranges fall in it; slices are
+    (index into parts, start, end) within that part, in the order they are sent
+    """
+    parts: List[int] = []
+    slices: List[Tuple[int, int, int]] = []
+    for from_bytes, until_bytes in ranges:
+        for part_offset in range(from_bytes - from_bytes % chunk_size, until_bytes + 1, chunk_size):
+            if not parts or parts[-1] != part_offset:
+                parts.append(part_offset)
+            start = max(from_bytes - part_offset, 0)
+            end = min(until_bytes - part_offset + 1, chunk_size)
+            slices.append((len(parts) - 1, start, end))
+    return parts, slices
+
+
+def slice_part(chunk: bytes, start: int, end: int) -> Union[bytes, memoryview]:
+    """
+    The requested bytes of a fetched part
+    Trimmed parts are memoryviews over the fetched buffer, so nothing is copied
+    """
+    if start == 0 and end >= len(chunk):
+        return chunk
+    return memoryview(chunk)[start:end]
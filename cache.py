@@ -0,0 +1,311 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple, Union
+from config import Config
+from logger import LOGGER
+
+
+class MetadataCache:
+    """
+    Bounded LRU cache with a per-entry TTL
+    Shared by every worker so a file is only resolved once per process
+    """
+    
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a live entry and mark it as recently used"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store an entry, evicting the least recently used ones past the size cap"""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """Drop an entry, returning its value if it was cached"""
+        entry = self._entries.pop(key, None)
+        return entry[1] if entry else None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/eviction counters"""
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class ChunkCache:
+    """
+    In-memory cache of fetched parts with a byte budget
+    Segmented LRU: new parts enter a probation segment and move to a protected
+    segment when read again, so one long sequential download only churns
+    probation and can't flush hot header/trailer parts
+    """
+    
+    CHUNK_SIZE = 1024 * 1024
+    
+    def __init__(self, max_bytes: int, protected_ratio: float = 0.8):
+        self.max_bytes = max_bytes
+        self.protected_max = int(max_bytes * protected_ratio)
+        self.enabled = max_bytes > 0
+        self._probation: "OrderedDict[Tuple[str, int, int], bytes]" = OrderedDict()
+        self._protected: "OrderedDict[Tuple[str, int, int], bytes]" = OrderedDict()
+        self.probation_bytes = 0
+        self.protected_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, unique_id: str, offset: int, limit: int) -> Optional[Union[bytes, memoryview]]:
+        """Return a cached part, or a view of the matching slice of the cached 1MB part holding it"""
+        if not self.enabled:
+            return None
+        
+        data = self._lookup((unique_id, offset, limit))
+        if data is None and limit < self.CHUNK_SIZE:
+            start = offset % self.CHUNK_SIZE
+            if start + limit <= self.CHUNK_SIZE:
+                chunk = self._lookup((unique_id, offset - start, self.CHUNK_SIZE))
+                if chunk is not None:
+                    data = memoryview(chunk)[start:start + limit]
+        
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def _lookup(self, key: Tuple[str, int, int]) -> Optional[bytes]:
+        data = self._protected.get(key)
+        if data is not None:
+            self._protected.move_to_end(key)
+            return data
+        
+        data = self._probation.pop(key, None)
+        if data is None:
+            return None
+        
+        # Second access: promote, demoting the coldest protected parts if needed
+        self.probation_bytes -= len(data)
+        self._protected[key] = data
+        self.protected_bytes += len(data)
+        while self.protected_bytes > self.protected_max and len(self._protected) > 1:
+            old_key, old_data = self._protected.popitem(last=False)
+            self.protected_bytes -= len(old_data)
+            self._probation[old_key] = old_data
+            self.probation_bytes += len(old_data)
+        self._evict()
+        return data
+
+    def put(self, unique_id: str, offset: int, limit: int, data: bytes) -> None:
+        """Add a freshly fetched part to the probation segment"""
+        if not self.enabled or not data or len(data) > self.max_bytes:
+            return
+        key = (unique_id, offset, limit)
+        if key in self._probation or key in self._protected:
+            return
+        self._probation[key] = bytes(data)
+        self.probation_bytes += len(data)
+        self._evict()
+
+    def _evict(self) -> None:
+        """Drop probation parts first, then protected ones, until under budget"""
+        while self.probation_bytes + self.protected_bytes > self.max_bytes:
+            if self._probation:
+                _, data = self._probation.popitem(last=False)
+                self.probation_bytes -= len(data)
+            else:
+                _, data = self._protected.popitem(last=False)
+                self.protected_bytes -= len(data)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Usage and hit/miss/eviction counters"""
+        return {
+            "chunks": len(self._probation) + len(self._protected),
+            "bytes": self.probation_bytes + self.protected_bytes,
+            "protected_bytes": self.protected_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class DiskChunkCache:
+    """
+    On-disk store of 1MB file chunks with a size budget and LRU eviction
+    Chunks live at ``<root>/<unique_id>/<chunk index>`` and are indexed in memory
+    """
+    
+    CHUNK_SIZE = 1024 * 1024
+    
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = max_bytes > 0
+        self._chunks: "OrderedDict[Tuple[str, int], int]" = OrderedDict()
+        self._writing = set()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.enabled:
+            self._load_index()
+
+    def _load_index(self) -> None:
+        """Rebuild the index from the chunks already on disk, oldest first"""
+        os.makedirs(self.root, exist_ok=True)
+        found = []
+        for file_dir in os.scandir(self.root):
+            if not file_dir.is_dir():
+                continue
+            for entry in os.scandir(file_dir.path):
+                if entry.name.isdigit():
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, (file_dir.name, int(entry.name)), stat.st_size))
+        for _, key, size in sorted(found):
+            self._chunks[key] = size
+            self.total_bytes += size
+        self._evict()
+        LOGGER.info(f"💾 Disk chunk cache: {len(self._chunks)} chunks, {self.total_bytes // (1024 * 1024)}MB")
+
+    def _path(self, key: Tuple[str, int]) -> str:
+        return os.path.join(self.root, key[0], str(key[1]))
+
+    def _covers(self, unique_id: str, offset: int, limit: int) -> bool:
+        index, start = divmod(offset, self.CHUNK_SIZE)
+        size = self._chunks.get((unique_id, index))
+        # A short chunk is the end of the file and covers everything after it
+        return size is not None and (start + limit <= size or size < self.CHUNK_SIZE)
+
+    async def get(self, unique_id: str, offset: int, limit: int) -> Optional[bytes]:
+        """Read ``limit`` bytes at ``offset`` if the chunk holding them is on disk"""
+        if not self.enabled:
+            return None
+        if not self._covers(unique_id, offset, limit):
+            self.misses += 1
+            return None
+        
+        key = (unique_id, offset // self.CHUNK_SIZE)
+        self._chunks.move_to_end(key)
+        try:
+            data = await asyncio.to_thread(self._read, self._path(key), offset % self.CHUNK_SIZE, limit)
+        except OSError:
+            self._drop(key)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    @staticmethod
+    def _read(path: str, start: int, limit: int) -> bytes:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            return os.pread(fd, limit, start)
+        finally:
+            os.close(fd)
+
+    def put(self, unique_id: str, offset: int, limit: int, data: bytes) -> None:
+        """
+        Store a fetched part in the background
+        Only whole chunks (or the last, short chunk of a file) are kept
+        """
+        if not self.enabled or not data or offset % self.CHUNK_SIZE or limit != self.CHUNK_SIZE:
+            return
+        key = (unique_id, offset // self.CHUNK_SIZE)
+        if key in self._chunks or key in self._writing:
+            return
+        self._writing.add(key)
+        asyncio.create_task(self._store(key, data))
+
+    async def _store(self, key: Tuple[str, int], data: bytes) -> None:
+        try:
+            await asyncio.to_thread(self._write, self._path(key), data)
+        except OSError as e:
+            LOGGER.warning(f"⚠️ Could not write chunk {key} to disk cache: {e}")
+            return
+        finally:
+            self._writing.discard(key)
+        self._chunks[key] = len(data)
+        self.total_bytes += len(data)
+        self._evict()
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _evict(self) -> None:
+        """Delete least recently used chunks until the cache fits its budget"""
+        while self.total_bytes > self.max_bytes and self._chunks:
+            key, _ = next(iter(self._chunks.items()))
+            self._drop(key)
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _drop(self, key: Tuple[str, int]) -> None:
+        size = self._chunks.pop(key, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def stats(self) -> Dict[str, int]:
+        """Usage and hit/miss/eviction counters"""
+        return {
+            "chunks": len(self._chunks),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Process-wide file properties cache keyed by (chat_id, message_id)
+file_cache = MetadataCache(Config.FILE_CACHE_SIZE, Config.FILE_CACHE_TTL)
+
+# In-memory hot part cache keyed by (unique_id, offset, limit)
+memory_cache = ChunkCache(Config.MEMORY_CACHE_SIZE * 1024 * 1024)
+
+# Optional on-disk chunk cache keyed by (unique_id, chunk index)
+disk_cache = DiskChunkCache(Config.DISK_CACHE_DIR, Config.DISK_CACHE_SIZE * 1024 * 1024)
@@ -21,3 +21,79 @@ class Config:
     
     # Owner ID (for admin commands)
     OWNER_ID = int(getenv("OWNER_ID", "0"))
+    
+    # Streaming engine
+    READ_AHEAD = int(getenv("READ_AHEAD", "4"))  # GetFile requests kept in flight per stream
+    WORKER_MAX_INFLIGHT = int(getenv("WORKER_MAX_INFLIGHT", "16"))  # GetFile requests in flight per worker
+    
+    # Striped downloads: fetch one large range through several workers at once
+    STRIPED_DOWNLOAD = getenv("STRIPED_DOWNLOAD", "False").lower() == "true"
+    STRIPE_WORKERS = int(getenv("STRIPE_WORKERS", "0"))  # 0 = use every worker
+    STRIPE_PARTS = int(getenv("STRIPE_PARTS", "2"))  # consecutive parts fetched by one worker
+    STRIPE_MIN_PARTS = int(getenv("STRIPE_MIN_PARTS", "8"))  # smaller ranges use a single worker
+    
+    # File properties cache (shared by all workers)
+    FILE_CACHE_SIZE = int(getenv("FILE_CACHE_SIZE", "10000"))  # max cached messages
+    FILE_CACHE_TTL = int(getenv("FILE_CACHE_TTL", "1800"))  # seconds, 30 minutes
+    
+    # On-disk chunk cache for popular files
+    DISK_CACHE_DIR = getenv("DISK_CACHE_DIR", "chunk_cache")
+    DISK_CACHE_SIZE = int(getenv("DISK_CACHE_SIZE", "0"))  # MB, 0 = disabled
+    
+    # In-memory cache for hot parts (MP4 headers, trailers, recent seeks)
+    MEMORY_CACHE_SIZE = int(getenv("MEMORY_CACHE_SIZE", "64"))  # MB, 0 = disabled
+    
+    # Worker scheduling: "weighted" (throughput, health, DC affinity) or "least_loaded"
+    SCHEDULER = getenv("SCHEDULER", "weighted")
+    SCHEDULER_DC_PENALTY = float(getenv("SCHEDULER_DC_PENALTY", "1.5"))  # cost factor without a media session on the DC
+    SCHEDULER_ERROR_PENALTY = float(getenv("SCHEDULER_ERROR_PENALTY", "4"))  # cost factor per unit of recent error rate
+    
+    # Mid-stream failover to another worker
+    STREAM_MAX_FAILOVERS = int(getenv("STREAM_MAX_FAILOVERS", "3"))  # worker switches per response
+    WORKER_ERROR_COOLDOWN = int(getenv("WORKER_ERROR_COOLDOWN", "30"))  # seconds out of rotation after a timeout or dead session
+    FAILOVER_MAX_WAIT = int(getenv("FAILOVER_MAX_WAIT", "10"))  # longest cooldown to wait out when no other worker is left
+    
+    # Media sessions (MTProto connections) kept per worker and DC
+    MEDIA_SESSIONS_PER_DC = int(getenv("MEDIA_SESSIONS_PER_DC", "1"))
+    
+    # Media session pre-warming at startup, refreshed in the background
+    PREWARM_MEDIA_SESSIONS = getenv("PREWARM_MEDIA_SESSIONS", "False").lower() == "true"
+    PREWARM_DCS = [int(dc) for dc in getenv("PREWARM_DCS", "").split(",") if dc.strip()]  # e.g. 1,2,4,5
+    PREWARM_INTERVAL = int(getenv("PREWARM_INTERVAL", "300"))  # seconds between keepalive checks
+    
+    # Admission control: stream slots per worker and a bounded fair queue
+    STREAMS_PER_WORKER = int(getenv("STREAMS_PER_WORKER", "20"))  # 0 = unlimited
+    ADMISSION_QUEUE = int(getenv("ADMISSION_QUEUE", "100"))  # requests waiting for a slot
+    ADMISSION_TIMEOUT = int(getenv("ADMISSION_TIMEOUT", "15"))  # seconds a request may wait
+    ADMISSION_QUEUE_PER_CLIENT = int(getenv("ADMISSION_QUEUE_PER_CLIENT", "10"))  # requests one client may have waiting; 0 = no limit
+    ADMISSION_FAIR_KEY = getenv("ADMISSION_FAIR_KEY", "ip")  # queue fairly per "ip" or per "link"
+    TRUSTED_PROXIES = [proxy.strip() for proxy in getenv("TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if proxy.strip()]  # addresses or networks whose X-Real-IP is believed (reverse proxies, peer nodes)
+    RETRY_AFTER = int(getenv("RETRY_AFTER", "5"))  # Retry-After seconds on 503
+    
+    # Backpressure: buffer per stream by client drain rate, free slots of stalled clients
+    STREAM_BUFFER_SECONDS = float(getenv("STREAM_BUFFER_SECONDS", "4"))  # seconds of client drain to buffer ahead
+    STREAM_MAX_BUFFER = int(getenv("STREAM_MAX_BUFFER", "8"))  # MB buffered or in flight per stream
+    STREAM_STALL_TIMEOUT = int(getenv("STREAM_STALL_TIMEOUT", "20"))  # seconds without reading before the worker slot is freed
+    STREAM_IDLE_TIMEOUT = int(getenv("STREAM_IDLE_TIMEOUT", "300"))  # seconds without reading before the connection is closed
+    
+    # Scale-out: several processes or hosts, each owning a share of the worker bots
+    WORKER_PROCESSES = int(getenv("WORKER_PROCESSES", "1"))  # local processes sharing PORT
+    NODE_COUNT = int(getenv("NODE_COUNT", "1"))  # total nodes; worker i belongs to node i % NODE_COUNT
+    NODE_INDEX = int(getenv("NODE_INDEX", "0"))  # this node; node 0 also runs the main bot
+    SHARED_STATE = getenv("SHARED_STATE", "memory")  # "memory" (single node) or "sqlite"
+    SHARED_STATE_PATH = getenv("SHARED_STATE_PATH", "shared_state.db")
+    NODE_HEARTBEAT = int(getenv("NODE_HEARTBEAT", "5"))  # seconds between node heartbeats
+    
+    # Peer mode: each file is served by the node owning it on a consistent-hash ring
+    PEER_MODE = getenv("PEER_MODE", "off").lower()  # "off", "proxy" or "redirect"
+    NODE_PORT = int(getenv("NODE_PORT", "0"))  # extra port reaching only this node; 0 = none
+    NODE_URL = getenv("NODE_URL", f"http://127.0.0.1:{NODE_PORT or PORT}").rstrip('/')  # how peers reach this node
+    PEER_TIMEOUT = int(getenv("PEER_TIMEOUT", "5"))  # seconds to connect to the owner before serving locally
+    
+    # Link tokens
+    LINK_SECRET = getenv("LINK_SECRET", "")  # HMAC key for signing links; empty = unsigned
+    LINK_CACHE_SIZE = int(getenv("LINK_CACHE_SIZE", "4096"))  # decoded links kept in memory
+    LINK_REQUIRE_SIGNED = getenv("LINK_REQUIRE_SIGNED", "False").lower() == "true"  # reject legacy base62 links
+    LINK_TTL = int(getenv("LINK_TTL", "0"))  # seconds new links stay valid; 0 = never expire
+    LINK_SCOPE_USER = getenv("LINK_SCOPE_USER", "False").lower() == "true"  # bind new links to the requesting user
+    LINK_REVOKED_USERS = {int(user) for user in getenv("LINK_REVOKED_USERS", "").split(",") if user.strip()}  # user IDs whose scoped links are refused
@@ -1,9 +1,37 @@
+import hmac
 import zlib
 import json
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import base64
+import time
+import struct
+import hashlib
+from functools import lru_cache
+from config import Config
 
-executor = ThreadPoolExecutor()
+# Compact links: "_" + URL-safe base64 of a struct-packed token
+# The prefix can't appear in legacy base62 links, so both kinds decode side by side
+TOKEN_PREFIX = "_"
+TOKEN_VERSION = 3
+TOKEN_HEADER = struct.Struct(">BBIqQB")  # version, flags, msg_id, chat_id, size, dc
+FLAG_SIGNED = 1
+FLAG_EXPIRES = 2  # unix expiry time follows the file_unique_id
+FLAG_SCOPED = 4  # Telegram user ID follows, links of revoked users stop working
+MAC_SIZE = 12
+EXPIRY = struct.Struct(">I")
+USER = struct.Struct(">q")
+
+# Common MIME types are stored as one byte; anything else follows code 255 as text
+MIME_TYPES = [
+    "", "video/mp4", "video/x-matroska", "video/webm", "video/quicktime", "video/x-msvideo",
+    "audio/mpeg", "audio/mp4", "audio/ogg", "audio/flac", "application/pdf", "application/zip",
+    "application/x-rar-compressed", "application/vnd.android.package-archive",
+    "application/octet-stream", "image/jpeg", "image/png",
+]
+MIME_CUSTOM = 255
+
+
+class LinkRejected(ValueError):
+    """A well-formed link that must not be served (forged, expired or revoked)"""
 
 def compress_data(data):
     """Compress data using zlib"""
@@ -31,40 +59,135 @@ def base62_decode(data):
         num = num * 62 + BASE62_ALPHABET.index(char)
     return num.to_bytes((num.bit_length() + 7) // 8, 'big') or b'\\0'
 
-async def async_compress_data(data):
-    """Async wrapper for compression"""
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(executor, compress_data, data)
+def sign(payload):
+    """Truncated HMAC-SHA256 of a token payload"""
+    return hmac.new(Config.LINK_SECRET.encode(), payload, hashlib.sha256).digest()[:MAC_SIZE]
+
+def pack_text(text):
+    raw = text.encode()
+    return struct.pack(">B", len(raw)) + raw
+
+def unpack_text(payload, pos):
+    length = payload[pos]
+    return payload[pos + 1:pos + 1 + length].decode(), pos + 1 + length
+
+def encode_link(data):
+    """
+    Encode link data to a compact token
+    Example: {"msg_id": 123, "chat_id": 456, "size": 789, ...} -> "_AwAAAAB7..."
+    Signed with LINK_SECRET when one is configured; optional "expires" (unix
+    time) and "user" (Telegram user ID) keys are carried under the signature
+    """
+    mime = data.get("mime") or ""
+    flags = FLAG_SIGNED if Config.LINK_SECRET else 0
+    if data.get("expires"):
+        flags |= FLAG_EXPIRES
+    if data.get("user"):
+        flags |= FLAG_SCOPED
+    payload = TOKEN_HEADER.pack(
+        TOKEN_VERSION, flags, int(data["msg_id"]), int(data["chat_id"]), int(data["size"]), int(data["dc"])
+    )
+    if mime in MIME_TYPES:
+        payload += struct.pack(">B", MIME_TYPES.index(mime))
+    else:
+        payload += struct.pack(">B", MIME_CUSTOM) + pack_text(mime)
+    payload += pack_text(data["uid"])
+    if flags & FLAG_EXPIRES:
+        payload += EXPIRY.pack(int(data["expires"]))
+    if flags & FLAG_SCOPED:
+        payload += USER.pack(int(data["user"]))
+    if flags & FLAG_SIGNED:
+        payload += sign(payload)
+    return TOKEN_PREFIX + base64.urlsafe_b64encode(payload).decode().rstrip("=")
 
-async def async_decompress_data(data):
-    """Async wrapper for decompression"""
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(executor, decompress_data, data)
+def decode_token(token):
+    """
+    Decode a compact token
+    With LINK_SECRET set every token must carry a valid signature, otherwise
+    stripping FLAG_SIGNED would let anyone edit the ids, expiry and scope
+    """
+    payload = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    if len(payload) < TOKEN_HEADER.size:
+        raise ValueError("malformed token")
+    version, flags, msg_id, chat_id, size, dc = TOKEN_HEADER.unpack_from(payload)
+    if version != TOKEN_VERSION:
+        raise ValueError(f"unsupported token version {version}")
+    
+    if flags & FLAG_SIGNED:
+        payload, mac = payload[:-MAC_SIZE], payload[-MAC_SIZE:]
+        if Config.LINK_SECRET and not hmac.compare_digest(mac, sign(payload)):
+            raise LinkRejected("bad signature")
+    elif Config.LINK_SECRET:
+        raise LinkRejected("unsigned link")
+    
+    pos = TOKEN_HEADER.size
+    mime_code = payload[pos]
+    pos += 1
+    if mime_code == MIME_CUSTOM:
+        mime, pos = unpack_text(payload, pos)
+    else:
+        mime = MIME_TYPES[mime_code]
+    uid, pos = unpack_text(payload, pos)
+    expires = user = None
+    if flags & FLAG_EXPIRES:
+        expires, = EXPIRY.unpack_from(payload, pos)
+        pos += EXPIRY.size
+    if flags & FLAG_SCOPED:
+        user, = USER.unpack_from(payload, pos)
+        pos += USER.size
+    if pos != len(payload):
+        raise ValueError("malformed token")
+    
+    return {
+        "v": TOKEN_VERSION,
+        "msg_id": msg_id,
+        "chat_id": chat_id,
+        "size": size,
+        "mime": mime,
+        "dc": dc,
+        "hash": uid[:6],
+        "uid": uid,
+        "expires": expires,
+        "user": user,
+    }
 
-async def async_base62_encode(data):
-    """Async wrapper for base62 encoding"""
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(executor, base62_encode, data)
+@lru_cache(maxsize=Config.LINK_CACHE_SIZE)
+def parse_link(encoded_data):
+    """
+    Parse a link token, compact or legacy, back to a dictionary
+    Runs inline in microseconds; repeated requests for a link hit the cache
+    The result is shared between callers and must not be modified
+    """
+    if encoded_data.startswith(TOKEN_PREFIX):
+        return decode_token(encoded_data[len(TOKEN_PREFIX):])
+    if Config.LINK_REQUIRE_SIGNED:
+        raise LinkRejected("unsigned link")
+    return json.loads(decompress_data(base62_decode(encoded_data)))
 
-async def async_base62_decode(data):
-    """Async wrapper for base62 decoding"""
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(executor, base62_decode, data)
+def decode_link(encoded_data):
+    """
+    Decode and verify a link without touching Telegram
+    Raises LinkRejected for forged, expired or revoked links, ValueError for garbage
+    Expiry and revocation are checked on every call, outside the parse cache
+    """
+    data = parse_link(encoded_data)
+    expires = data.get("expires")
+    if expires and expires <= time.time():
+        raise LinkRejected("link expired")
+    if data.get("user") in Config.LINK_REVOKED_USERS:
+        raise LinkRejected("link revoked")
+    return data
 
 async def encode_string(data):
     """
-    Encode dictionary to compressed base62 string
+    Encode dictionary to compressed base62 string (legacy link format)
     Example: {"msg_id": 123, "chat_id": 456} -> "3kT9mN2pQ"
     """
-    json_data = json.dumps(data)
-    compressed_data = await async_compress_data(json_data)
-    return await async_base62_encode(compressed_data)
+    return base62_encode(compress_data(json.dumps(data)))
 
 async def decode_string(encoded_data):
     """
     Decode base62 string back to dictionary
     Example: "3kT9mN2pQ" -> {"msg_id": 123, "chat_id": 456}
     """
-    compressed_data = await async_base62_decode(encoded_data)
-    json_data = await async_decompress_data(compressed_data)
-    return json.loads(json_data)
+    return decode_link(encoded_data)
@@ -1,43 +1,55 @@
 import asyncio
-from asyncio import sleep as asleep
 from traceback import format_exc
 from pyrogram import idle
 import logging
 
 from logger import LOGGER
-from bot import MainBot, WorkerBots, initialize_workers
+from bot import MainBot, WorkerBots, count_bots, initialize_workers, owns_worker, start_main_bot, startup
 from config import Config
 
 # Version
 __version__ = "1.0.0"
 
 async def start_services():
-    """Start all services in proper sequence"""
+    """
+    Start all services
+    The web server comes up first and answers what it can from the links
+    alone; the main bot and the workers start side by side, and streams are
+    served as soon as any one worker is ready
+    """
     try:
         LOGGER.info(f"🚀 Initializing File-to-Link Bot v{__version__}")
-        await asleep(1)
-        
-        # Start main bot
-        LOGGER.info("Starting main bot...")
-        await MainBot.start()
-        MainBot.username = MainBot.me.username
-        LOGGER.info(f"✅ Main Bot: @{MainBot.username}")
-        await asleep(1)
-        
-        # Initialize worker bots
-        LOGGER.info("Initializing worker bots for load balancing...")
-        await initialize_workers()
-        await asleep(1.5)
         
         # Start FastAPI server
         LOGGER.info('Starting FastAPI web server...')
-        from server import start_server
+        from server import start_server, listen_sockets, keep_node_registered
         server = start_server()
-        asyncio.create_task(server.serve())
-        await asleep(1)
+        serving = asyncio.create_task(server.serve(sockets=listen_sockets()))
+        while not server.started:
+            if serving.done():
+                # Binding failed; surface uvicorn's error
+                serving.result()
+                raise RuntimeError("Web server exited during startup")
+            await asyncio.sleep(0.01)
+        startup.mark("Web server listening")
+        asyncio.create_task(keep_node_registered())
+        
+        # Start main bot (only node 0 runs it when scaled out) and worker bots together
+        LOGGER.info("Initializing worker bots for load balancing...")
+        bots = [initialize_workers()]
+        if owns_worker(0):
+            bots.append(start_main_bot())
+        await asyncio.gather(*bots)
+        startup.finished = True
+        startup.mark(f"All bots started ({len(WorkerBots)} workers)")
+        
+        # Pre-warm media sessions so the first request skips the DC handshake
+        if Config.PREWARM_MEDIA_SESSIONS:
+            from server import keep_media_sessions_warm
+            asyncio.create_task(keep_media_sessions_warm())
         
         # Start health ping (keep-alive)
-        if Config.BASE_URL:
+        if Config.BASE_URL and owns_worker(0):
             LOGGER.info("Starting health check service...")
             asyncio.create_task(health_ping())
         
@@ -47,6 +59,8 @@ async def start_services():
         LOGGER.info(f"🔧 Port: {Config.PORT}")
         LOGGER.info(f"📂 Dump Channel: {Config.DUMP_CHANNEL}")
         LOGGER.info(f"🤖 Worker Bots: {len(WorkerBots)}")
+        if Config.NODE_COUNT > 1:
+            LOGGER.info(f"🧩 Node: {Config.NODE_INDEX} of {Config.NODE_COUNT} (shared state: {Config.SHARED_STATE})")
         LOGGER.info("="*50)
         
         # Keep running
@@ -69,8 +83,9 @@ async def stop_services():
         await asyncio.gather(*pending_tasks, return_exceptions=True)
         
         # Stop main bot
-        await MainBot.stop()
-        LOGGER.info("✅ Main bot stopped")
+        if MainBot.is_connected:
+            await MainBot.stop()
+            LOGGER.info("✅ Main bot stopped")
         
         # Stop all worker bots
         for index, worker in WorkerBots.items():
@@ -107,8 +122,61 @@ async def health_ping():
         except Exception as e:
             LOGGER.error(f"❌ Health check failed: {e}")
 
+def run_processes(count):
+    """
+    Run one node per process on this host
+    The processes share PORT and keep their common state in SQLite
+    """
+    import multiprocessing
+    from os import environ
+    from urllib.parse import urlsplit
+    
+    # Each process is reached on its own port at the host given by NODE_URL
+    node_host = urlsplit(environ.get("NODE_URL", "")).hostname
+    if Config.PEER_MODE == "redirect" and not node_host:
+        LOGGER.error("❌ PEER_MODE=redirect sends clients to each process's own port; set NODE_URL to a host clients can reach")
+        return
+    node_host = f"[{node_host}]" if node_host and ":" in node_host else node_host or "127.0.0.1"
+    
+    shared = Config.SHARED_STATE if Config.SHARED_STATE != "memory" else "sqlite"
+    LOGGER.info(f"🧩 Starting {count} worker processes (shared state: {shared})")
+    
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for index in range(count):
+        environ.update(
+            WORKER_PROCESSES="1",
+            NODE_COUNT=str(count),
+            NODE_INDEX=str(index),
+            SHARED_STATE=shared,
+        )
+        if Config.PEER_MODE != "off":
+            # Every process gets its own port so peers can reach it directly
+            node_port = (Config.NODE_PORT or Config.PORT + 1) + index
+            environ.update(NODE_PORT=str(node_port), NODE_URL=f"http://{node_host}:{node_port}")
+        process = context.Process(target=main, name=f"node-{index}")
+        process.start()
+        processes.append(process)
+    
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        LOGGER.info('⚠️  Waiting for worker processes to stop...')
+        for process in processes:
+            process.join()
+
 def main():
     """Main entry point"""
+    if Config.WORKER_PROCESSES > 1:
+        # A process without a bot would still take its share of PORT and answer 503
+        bots = count_bots()
+        if Config.WORKER_PROCESSES > bots:
+            LOGGER.warning(f"⚠️  Only {bots} bots for {Config.WORKER_PROCESSES} worker processes; starting {bots}")
+            Config.WORKER_PROCESSES = bots
+    if Config.WORKER_PROCESSES > 1:
+        return run_processes(Config.WORKER_PROCESSES)
+    
     loop = asyncio.get_event_loop()
     
     try:
@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+from bisect import bisect
+from typing import Dict, Iterable, List, Optional, Tuple
+import aiohttp
+from fastapi import Request
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from config import Config
+from logger import LOGGER
+
+# Marks a request that another node already routed, so it is served where it lands
+PEER_HEADER = "X-Peer-Node"
+PEER_PARAM = "peer"
+
+# Request headers a proxied range request needs on the owner
+FORWARDED_HEADERS = ("Range", "If-Range", "If-None-Match", "If-Modified-Since", "User-Agent")
+
+# Connection-level response headers that must not be copied back to the client
+HOP_BY_HOP = {"connection", "keep-alive", "transfer-encoding", "server", "date"}
+
+
+def ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring of node indexes
+    Each node gets ``replicas`` points so files spread evenly, and a node
+    joining or leaving only moves the files next to its own points
+    """
+    
+    def __init__(self, nodes: Iterable[int], replicas: int = 64):
+        self.nodes = frozenset(nodes)
+        self._points: List[Tuple[int, int]] = sorted(
+            (ring_hash(f"{node}#{replica}"), node)
+            for node in self.nodes for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in self._points]
+
+    def owner(self, key: str) -> Optional[int]:
+        if not self._points:
+            return None
+        position = bisect(self._hashes, ring_hash(key)) % len(self._points)
+        return self._points[position][1]
+
+
+class PeerRouter:
+    """
+    Sends each file's requests to the node that owns it on the ring
+    so hot files are fetched and cached by one node instead of all of them
+    Non-owners proxy the response or redirect the client, depending on PEER_MODE
+    """
+    
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.ring = HashRing([])
+        self.urls: Dict[int, str] = {}
+        self.proxied = 0
+        self.redirected = 0
+        self.failures = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("proxy", "redirect")
+
+    def update(self, nodes: Dict[int, dict]) -> None:
+        """Rebuild the ring from the nodes that sent a heartbeat recently"""
+        urls = {node: info["url"] for node, info in nodes.items() if info.get("url")}
+        if set(urls) != self.ring.nodes:
+            LOGGER.info(f"💍 Peer ring now has nodes: {sorted(urls)}")
+            self.ring = HashRing(urls)
+        self.urls = urls
+
+    @staticmethod
+    def is_forwarded(request: Request) -> bool:
+        return PEER_HEADER in request.headers or PEER_PARAM in request.query_params
+
+    def owner_url(self, unique_id: str) -> Optional[str]:
+        """Base URL of the file's owner, or None when this node should serve it"""
+        owner = self.ring.owner(unique_id)
+        if owner is None or owner == Config.NODE_INDEX:
+            return None
+        return self.urls.get(owner)
+
+    async def forward(self, request: Request, base_url: str, client_ip: str) -> Optional[Response]:
+        """
+        Hand the request to the owner
+        Returns None when the owner can't be reached, so the caller serves it locally
+        """
+        url = f"{base_url}{request.url.path}"
+        if self.mode == "redirect":
+            self.redirected += 1
+            query = f"{request.url.query}&" if request.url.query else ""
+            return RedirectResponse(f"{url}?{query}{PEER_PARAM}={Config.NODE_INDEX}", status_code=307)
+        
+        if request.url.query:
+            url = f"{url}?{request.url.query}"
+        headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+        headers[PEER_HEADER] = str(Config.NODE_INDEX)
+        headers["X-Real-IP"] = client_ip
+        
+        try:
+            upstream = await self.session().request(request.method, url, headers=headers, allow_redirects=False)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.failures += 1
+            LOGGER.warning(f"⚠️ Peer {base_url} unreachable, serving locally: {e}")
+            return None
+        
+        self.proxied += 1
+        response_headers = {
+            name: value for name, value in upstream.headers.items() if name.lower() not in HOP_BY_HOP
+        }
+        
+        async def body():
+            try:
+                async for chunk in upstream.content.iter_chunked(256 * 1024):
+                    yield chunk
+            finally:
+                upstream.release()
+        
+        return StreamingResponse(body(), status_code=upstream.status, headers=response_headers)
+
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=Config.PEER_TIMEOUT),
+                auto_decompress=False,
+            )
+        return self._session
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "nodes": len(self.ring.nodes),
+            "proxied": self.proxied,
+            "redirected": self.redirected,
+            "failures": self.failures,
+        }
+
+
+peers = PeerRouter(Config.PEER_MODE)
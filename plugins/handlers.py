@@ -1,10 +1,12 @@
 from pyrogram import Client, filters
+from pyrogram.file_id import FileId
 from pyrogram.types import Message
 from config import Config
-from encrypt import encode_string
+from encrypt import encode_link
 from logger import LOGGER
 import re
 import os
+import time
 
 
 def sanitize_filename(filename: str, max_length: int = 60) -> str:
@@ -28,10 +30,20 @@ def sanitize_filename(filename: str, max_length: int = 60) -> str:
     return f"{name}{ext}"
 
 
+def readable_duration(seconds: int) -> str:
+    """Format a link lifetime, e.g. 90000 -> '1d 1h'"""
+    days, rest = divmod(seconds, 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes = rest // 60
+    parts = [f"{value}{unit}" for value, unit in ((days, "d"), (hours, "h"), (minutes, "m")) if value]
+    return " ".join(parts) or f"{seconds}s"
+
+
 @Client.on_message(filters.command("start") & filters.private)
 async def start_handler(client: Client, message: Message):
     """Handle /start command"""
     user_name = message.from_user.first_name if message.from_user else "User"
+    expiry_text = f"Links expire after {readable_duration(Config.LINK_TTL)}" if Config.LINK_TTL else "No expiration"
     
     welcome_text = f"""
 👋 **Hello {user_name}!**
@@ -44,7 +56,7 @@ Send me any file (document, video, audio) and I'll generate a direct download li
 • Fast streaming links (50-100 MB/s)
 • Support for files up to 4GB
 • Byte-range support (seekable videos)
-• No expiration
+• {expiry_text}
 
 📤 **How to use:**
 Just send me a file and I'll do the rest!
@@ -121,18 +133,32 @@ async def file_handler(client: Client, message: Message):
         # Converts -1002318728082 -> 2318728082
         channel_id = str(Config.DUMP_CHANNEL).replace("-100", "", 1) if str(Config.DUMP_CHANNEL).startswith("-100") else str(Config.DUMP_CHANNEL)
         
+        # Links carry the file properties so the server can answer
+        # headers, range checks and revalidations without asking Telegram
         data = {
             "msg_id": dump_message.id,
-            "chat_id": channel_id  # Store without -100 prefix
+            "chat_id": channel_id,  # Store without -100 prefix
+            "size": file_size,
+            "mime": getattr(file, 'mime_type', None) or "",
+            "dc": FileId.decode(file.file_id).dc_id,
+            "uid": file.file_unique_id
         }
+        if Config.LINK_TTL:
+            data["expires"] = int(time.time()) + Config.LINK_TTL
+        if Config.LINK_SCOPE_USER and message.from_user:
+            data["user"] = message.from_user.id
         
-        encrypted_id = await encode_string(data)
+        encrypted_id = encode_link(data)
         
         # Sanitize filename for URL
         safe_filename = sanitize_filename(file_name)
         download_url = f"{Config.BASE_URL}/dl/{encrypted_id}/{safe_filename}"
         
         # Send link to user
+        if Config.LINK_TTL:
+            expiry_tip = f"This link is valid for {readable_duration(Config.LINK_TTL)}"
+        else:
+            expiry_tip = "This link will never expire"
         response_text = f"""
 ✅ **File Uploaded Successfully!**
 
@@ -142,7 +168,7 @@ async def file_handler(client: Client, message: Message):
 🔗 **Download Link:**
 `{download_url}`
 
-💡 **Tip:** This link will never expire and supports seeking in video players!
+💡 **Tip:** {expiry_tip} and supports seeking in video players!
 
 ⚡ **Speed:** 50-100 MB/s (from Telegram's CDN)
         """
@@ -171,14 +197,71 @@ async def file_handler(client: Client, message: Message):
 @Client.on_message(filters.command("stats") & filters.user(Config.OWNER_ID))
 async def stats_handler(client: Client, message: Message):
     """Show bot statistics (owner only)"""
-    from bot import WorkLoads
+    from admission import admission
+    from backpressure import monitor
+    from bot import WorkLoads, startup
+    from byte_streamer import metadata_flight, chunk_flight
+    from cache import disk_cache, file_cache, memory_cache
+    from peers import peers
+    from scheduler import scheduler
+    from server import get_readable_file_size
+    from shared_state import shared_state
     
     stats_text = "📊 **Bot Statistics**\n\n"
-    stats_text += f"👥 **Worker Bots:** {len(WorkLoads)}\n\n"
+    stats_text += f"👥 **Worker Bots:** {len(WorkLoads)}\n"
+    startup_stats = startup.stats()
+    stats_text += f"⏱️ **Startup:** {' | '.join(f'{event}: {elapsed}s' for event, elapsed in startup_stats['events'].items())}\n\n"
     
     stats_text += "**Load Distribution:**\n"
+    now = time.monotonic()
     for index, load in WorkLoads.items():
-        stats_text += f"• Worker {index}: {load} active streams\n"
+        worker = scheduler.worker_stats(index)
+        stats_text += f"• Worker {index}: {load} active streams, {get_readable_file_size(int(worker.rate))}/s"
+        if worker.in_cooldown(now):
+            stats_text += f" ⏳ cooldown {int(worker.cooldown_until - now)}s"
+        stats_text += "\n"
+    
+    if Config.NODE_COUNT > 1:
+        nodes = await shared_state.nodes()
+        stats_text += f"\n**Cluster:** {len(nodes)}/{Config.NODE_COUNT} nodes up\n"
+        for node, info in sorted(nodes.items()):
+            loads = ", ".join(f"W{index}: {load}" for index, load in sorted(info["workers"].items(), key=lambda item: int(item[0])))
+            stats_text += f"• Node {node}: {loads or 'no workers'} | {info['stalled']} stalled\n"
+        
+        if peers.enabled:
+            peer_stats = peers.stats()
+            stats_text += f"• Peer {Config.PEER_MODE}: {peer_stats['nodes']} on ring | {peer_stats['proxied']} proxied, {peer_stats['redirected']} redirected, {peer_stats['failures']} failed\n"
+    
+    cache_stats = file_cache.stats()
+    stats_text += "\n**File Cache:**\n"
+    stats_text += f"• Entries: {cache_stats['size']}/{cache_stats['max_size']}\n"
+    stats_text += f"• Hits: {cache_stats['hits']} | Misses: {cache_stats['misses']}\n"
+    stats_text += f"• Evictions: {cache_stats['evictions']} | Expired: {cache_stats['expirations']}\n"
+    
+    if memory_cache.enabled:
+        memory_stats = memory_cache.stats()
+        stats_text += "\n**Memory Cache:**\n"
+        stats_text += f"• Parts: {memory_stats['chunks']} ({memory_stats['bytes'] // (1024 * 1024)}/{memory_stats['max_bytes'] // (1024 * 1024)} MB)\n"
+        stats_text += f"• Hits: {memory_stats['hits']} | Misses: {memory_stats['misses']} | Evictions: {memory_stats['evictions']}\n"
+    
+    if disk_cache.enabled:
+        disk_stats = disk_cache.stats()
+        stats_text += "\n**Disk Cache:**\n"
+        stats_text += f"• Chunks: {disk_stats['chunks']} ({disk_stats['bytes'] // (1024 * 1024)}/{disk_stats['max_bytes'] // (1024 * 1024)} MB)\n"
+        stats_text += f"• Hits: {disk_stats['hits']} | Misses: {disk_stats['misses']} | Evictions: {disk_stats['evictions']}\n"
+    
+    if admission.enabled:
+        admission_stats = admission.stats()
+        stats_text += "\n**Admission:**\n"
+        stats_text += f"• Active: {admission_stats['active']} | Queued: {admission_stats['queued']} ({admission_stats['clients_waiting']} clients)\n"
+        stats_text += f"• Admitted: {admission_stats['admitted']} | Rejected: {admission_stats['rejected']}\n"
+    
+    stats_text += "\n**Slow Clients:**\n"
+    stats_text += f"• Stalled now: {monitor.stalled} | Stalls: {monitor.stalls} | Idle closed: {monitor.aborts}\n"
+    
+    stats_text += "\n**Request Coalescing:**\n"
+    stats_text += f"• Lookups: {metadata_flight.calls} sent, {metadata_flight.shared} shared\n"
+    stats_text += f"• Chunks: {chunk_flight.calls} sent, {chunk_flight.shared} shared\n"
     
     await message.reply_text(stats_text)
 
@@ -0,0 +1,137 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Set
+from bot import WorkerBots, WorkLoads
+from config import Config
+from logger import LOGGER
+
+
+class WorkerStats:
+    """Live health and performance figures for one worker bot"""
+    
+    def __init__(self):
+        self.rate = 0.0  # EWMA of bytes/s per GetFile call
+        self.latency = 0.0  # EWMA of seconds per GetFile call
+        self.error_rate = 0.0  # EWMA of failed calls, 0..1
+        self.cooldown_until = 0.0
+        self.bytes_served = 0
+        self.samples = 0
+
+    def in_cooldown(self, now: float) -> bool:
+        return self.cooldown_until > now
+
+
+class Scheduler(ABC):
+    """
+    Chooses the worker bot for a request
+    Subclasses implement ``score``; the lowest score wins
+    """
+    
+    EWMA_ALPHA = 0.2
+    
+    def __init__(self):
+        self.stats: Dict[int, WorkerStats] = {}
+
+    def worker_stats(self, index: int) -> WorkerStats:
+        stats = self.stats.get(index)
+        if stats is None:
+            stats = self.stats[index] = WorkerStats()
+        return stats
+
+    def record_fetch(self, index: int, size: int, seconds: float) -> None:
+        """Account a successful GetFile call"""
+        stats = self.worker_stats(index)
+        rate = size / max(seconds, 1e-6)
+        if stats.samples:
+            stats.rate += self.EWMA_ALPHA * (rate - stats.rate)
+            stats.latency += self.EWMA_ALPHA * (seconds - stats.latency)
+        else:
+            stats.rate, stats.latency = rate, seconds
+        stats.error_rate *= 1 - self.EWMA_ALPHA
+        stats.bytes_served += size
+        stats.samples += 1
+
+    def record_error(self, index: int) -> None:
+        """Account a failed GetFile call"""
+        stats = self.worker_stats(index)
+        stats.error_rate += self.EWMA_ALPHA * (1 - stats.error_rate)
+
+    def record_flood_wait(self, index: int, seconds: float) -> None:
+        """Keep a throttled worker out of rotation until its FloodWait is over"""
+        self.cooldown(index, seconds, "FloodWait")
+
+    def cooldown(self, index: int, seconds: float, reason: str) -> None:
+        """Take a worker out of rotation for a while"""
+        stats = self.worker_stats(index)
+        until = time.monotonic() + seconds
+        self.record_error(index)
+        if until > stats.cooldown_until + 1:
+            LOGGER.warning(f"⏳ Worker {index} cooling down for {seconds}s ({reason})")
+        stats.cooldown_until = max(stats.cooldown_until, until)
+
+    def has_media_session(self, index: int, dc_id: Optional[int]) -> bool:
+        """Whether the worker already holds a media session for the DC"""
+        if dc_id is None:
+            return True
+        client = WorkerBots.get(index)
+        return bool(client is not None and getattr(client, "media_sessions", {}).get(dc_id))
+
+    @abstractmethod
+    def score(self, index: int, dc_id: Optional[int]) -> float:
+        """Expected cost of giving this worker the next stream"""
+
+    def rank(self, dc_id: Optional[int] = None, exclude: Iterable[int] = ()) -> List[int]:
+        """
+        Workers ordered best first
+        Workers in cooldown go last, soonest available first
+        """
+        excluded: Set[int] = set(exclude)
+        candidates = [i for i in WorkLoads if i in WorkerBots and i not in excluded]
+        now = time.monotonic()
+        ready = [i for i in candidates if not self.worker_stats(i).in_cooldown(now)]
+        cooling = [i for i in candidates if self.worker_stats(i).in_cooldown(now)]
+        ready.sort(key=lambda i: self.score(i, dc_id))
+        cooling.sort(key=lambda i: self.worker_stats(i).cooldown_until)
+        return ready + cooling
+
+    def pick(self, dc_id: Optional[int] = None, exclude: Iterable[int] = ()) -> Optional[int]:
+        """The best worker for a request, or None when there is none"""
+        ranked = self.rank(dc_id, exclude)
+        return ranked[0] if ranked else None
+
+
+class LeastLoadedScheduler(Scheduler):
+    """The original policy: fewest active streams"""
+    
+    def score(self, index: int, dc_id: Optional[int]) -> float:
+        return WorkLoads.get(index, 0)
+
+
+class WeightedScheduler(Scheduler):
+    """
+    Estimates how long a worker would take to serve the next stream
+    from its measured throughput, its active streams, its recent errors
+    and whether it already has a media session on the file's DC
+    """
+    
+    def score(self, index: int, dc_id: Optional[int]) -> float:
+        stats = self.worker_stats(index)
+        rate = stats.rate if stats.samples else self._default_rate()
+        cost = (WorkLoads.get(index, 0) + 1) / max(rate, 1.0)
+        cost *= 1 + Config.SCHEDULER_ERROR_PENALTY * stats.error_rate
+        if not self.has_media_session(index, dc_id):
+            cost *= Config.SCHEDULER_DC_PENALTY
+        return cost
+
+    def _default_rate(self) -> float:
+        """Unmeasured workers are assumed to be average so they get tried"""
+        rates = [s.rate for s in self.stats.values() if s.samples]
+        return sum(rates) / len(rates) if rates else 1024 * 1024
+
+
+SCHEDULERS = {
+    "least_loaded": LeastLoadedScheduler,
+    "weighted": WeightedScheduler,
+}
+
+scheduler: Scheduler = SCHEDULERS.get(Config.SCHEDULER, WeightedScheduler)()
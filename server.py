@@ -1,16 +1,31 @@
-import math
+import re
+import time
+import socket
+import struct
+import ipaddress
 import secrets
 import mimetypes
-from typing import Tuple
+from functools import lru_cache
+from typing import List, Optional, Tuple
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-from encrypt import decode_string
-from byte_streamer import ByteStreamer
-from bot import WorkerBots, get_least_loaded_bot
+from encrypt import decode_link, LinkRejected
+import asyncio
+from asyncio import gather
+from byte_streamer import (
+    ByteStreamer, WorkerUnavailable, cached_file_properties, choose_chunk_size, plan_ranges, yield_file_striped
+)
+from admission import Overloaded, Ticket, admission
+from backpressure import monitor
+from bot import WorkerBots, WorkLoads, startup
 from config import Config
 from logger import LOGGER
+from peers import peers
+from scheduler import scheduler
+from shared_state import shared_state
 
 app = FastAPI(title="File-to-Link Bot API")
 
@@ -26,28 +41,156 @@ app.add_middleware(
 # Cache for ByteStreamer instances
 class_cache = {}
 
+# The running uvicorn server, set by start_server
+http_server: Optional[uvicorn.Server] = None
 
-def parse_range_header(range_header: str, file_size: int) -> Tuple[int, int]:
-    """Parse HTTP Range header"""
-    if not range_header:
-        return 0, file_size - 1
+# DCs of files requested since startup, kept warm alongside PREWARM_DCS
+seen_dcs = set()
+
+# One byte-range-spec: "first-last", "first-" or "-suffix"
+RANGE_SPEC = re.compile(r"(\d*)\s*-\s*(\d*)")
+MAX_RANGES = 16
+
+# Reverse proxies and peer nodes allowed to tell us the client's address
+TRUSTED_PROXIES = [ipaddress.ip_network(proxy, strict=False) for proxy in Config.TRUSTED_PROXIES]
+
+
+def get_byte_streamer(index: int) -> ByteStreamer:
+    """Get or create the ByteStreamer for a worker bot"""
+    tg_connect = class_cache.get(index)
+    if not tg_connect:
+        tg_connect = ByteStreamer(WorkerBots[index], index)
+        class_cache[index] = tg_connect
+    return tg_connect
+
+
+async def warm_media_sessions():
+    """Open media sessions for the configured and recently seen DCs on every worker"""
+    dc_ids = sorted(set(Config.PREWARM_DCS) | seen_dcs)
+    if not dc_ids:
+        return
     
-    try:
-        range_value = range_header.replace("bytes=", "")
-        from_str, until_str = range_value.split("-")
-        from_bytes = int(from_str)
-        until_bytes = int(until_str) if until_str else file_size - 1
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Invalid Range header: {e}")
+    jobs = [
+        (index, dc_id, get_byte_streamer(index).warm_media_sessions(dc_id))
+        for index in list(WorkerBots) for dc_id in dc_ids
+    ]
+    results = await gather(*(job for _, _, job in jobs), return_exceptions=True)
+    for (index, dc_id, _), result in zip(jobs, results):
+        if isinstance(result, Exception):
+            LOGGER.warning(f"⚠️ Worker {index}: could not warm media session for DC {dc_id}: {result}")
+
+
+async def keep_media_sessions_warm():
+    """Pre-warm media sessions, then re-check and re-establish them periodically"""
+    LOGGER.info(f"🔥 Pre-warming media sessions for DCs: {Config.PREWARM_DCS or 'seen in links'}")
+    while True:
+        await warm_media_sessions()
+        await asyncio.sleep(Config.PREWARM_INTERVAL)
+
+
+async def keep_node_registered():
+    """
+    Publish this node's worker loads and address to the shared state
+    and keep the peer ring in step with the nodes that are up
+    """
+    while True:
+        info = {
+            "workers": dict(WorkLoads),
+            "stalled": admission.stalled,
+            "url": Config.NODE_URL,
+        }
+        try:
+            await shared_state.publish_node(Config.NODE_INDEX, info)
+        except Exception as e:
+            LOGGER.warning(f"⚠️ Could not publish node state: {e}")
+        
+        if peers.enabled:
+            try:
+                peers.update(await shared_state.nodes())
+            except Exception as e:
+                LOGGER.warning(f"⚠️ Could not refresh the peer ring: {e}")
+        await asyncio.sleep(Config.NODE_HEARTBEAT)
+
+
+def get_stripe_lanes(index: int, file_id, part_count: int):
+    """
+    Pick the workers that will fetch a range together
+    Large ranges are striped over the best ranked workers when STRIPED_DOWNLOAD is on.
+    The file ID is shared by every lane, like the process-wide file cache
+    it came from, so a refreshed file reference reaches all of them
+    """
+    lanes = [(index, class_cache[index], file_id)]
+    if not Config.STRIPED_DOWNLOAD or part_count < Config.STRIPE_MIN_PARTS:
+        return lanes
+    
+    limit = Config.STRIPE_WORKERS or len(WorkerBots)
+    now = time.monotonic()
+    others = [
+        i for i in scheduler.rank(file_id.dc_id, exclude=[index])
+        if not scheduler.worker_stats(i).in_cooldown(now)
+    ]
+    lanes.extend((other, get_byte_streamer(other), file_id) for other in others[:limit - 1])
+    return lanes
+
 
-    if (until_bytes > file_size - 1) or (from_bytes < 0) or (until_bytes < from_bytes):
+def parse_range_header(range_header: str, file_size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse HTTP Range header (RFC 7233)
+    Accepts first-last, open-ended first- and suffix -length specs, several
+    per header. Returns the satisfiable ranges sorted with overlaps merged,
+    or None when the whole file should be sent; a header with an invalid
+    spec is ignored, as RFC 7233 requires
+    """
+    if not range_header:
+        return None
+    
+    unit, _, range_set = range_header.partition("=")
+    if unit.strip().lower() != "bytes":
+        # Unknown range units are ignored
+        return None
+    
+    ranges = []
+    specs = [spec.strip() for spec in range_set.split(",") if spec.strip()]
+    for spec in specs:
+        match = RANGE_SPEC.fullmatch(spec)
+        if not match or match.group(1) == match.group(2) == "":
+            return None
+        
+        first, last = match.groups()
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length > 0 and file_size > 0:
+                ranges.append((max(file_size - length, 0), file_size - 1))
+            continue
+        
+        from_bytes = int(first)
+        if last and int(last) < from_bytes:
+            return None
+        until_bytes = int(last) if last else file_size - 1
+        if from_bytes < file_size:
+            ranges.append((from_bytes, min(until_bytes, file_size - 1)))
+    
+    if not specs:
+        return None
+    if not ranges:
         raise HTTPException(
             status_code=416,
             detail="Requested Range Not Satisfiable",
             headers={"Content-Range": f"bytes */{file_size}"},
         )
-
-    return from_bytes, until_bytes
+    
+    merged = []
+    for from_bytes, until_bytes in sorted(ranges):
+        if merged and from_bytes <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], until_bytes))
+        else:
+            merged.append((from_bytes, until_bytes))
+    
+    # Too many pieces cost more than they save; RFC 7233 lets us send the whole file
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
 
 
 @app.get("/")
@@ -58,11 +201,22 @@ async def root():
         "bot": "File-to-Link Bot",
         "version": "1.0.0",
         "endpoints": {
-            "download": "/dl/{id}/{name}"
+            "download": "/dl/{id}/{name}",
+            "ready": "/ready"
         }
     }
 
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe for load balancers and deploy scripts
+    200 once a worker can serve streams, 503 before that
+    """
+    body = {**startup.stats(), "workers": len(WorkerBots)}
+    return JSONResponse(body, status_code=200 if startup.ready else 503)
+
+
 @app.get("/dl/{id}/{name}")
 @app.head("/dl/{id}/{name}")
 async def stream_handler(request: Request, id: str, name: str):
@@ -70,9 +224,12 @@ async def stream_handler(request: Request, id: str, name: str):
     Main streaming endpoint
     Decodes the file ID and streams the file from Telegram
     """
-    # Decode the encrypted ID
+    # Decode the encrypted ID; forged, expired and revoked links stop here,
+    # before any worker or metadata lookup
     try:
-        decoded_data = await decode_string(id)
+        decoded_data = decode_link(id)
+    except LinkRejected as e:
+        raise HTTPException(status_code=403, detail=f"Link rejected: {e}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid file ID: {e}")
     
@@ -88,89 +245,109 @@ async def stream_handler(request: Request, id: str, name: str):
         chat_id = channel_id_str
     
     message_id = decoded_data["msg_id"]
-    
-    # Get file info to validate
-    from bot import MainBot
-    try:
-        message = await MainBot.get_messages(int(chat_id), int(message_id))
-        file = message.video or message.document or message.audio or message.voice
-        if not file:
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        file_hash = file.file_unique_id[:6]
-    except Exception as e:
-        raise HTTPException(status_code=404, detail=f"File not found: {e}")
 
+    # Metadata is resolved once, through a worker and the shared file cache
+    # v2 links carry the file properties, so headers need no lookup at all
     return await media_streamer(
         request,
         chat_id=int(chat_id),
         id=int(message_id),
-        secure_hash=file_hash
+        secure_hash=decoded_data.get("hash"),
+        file_info=parse_file_info(decoded_data),
+        name=name
     )
 
 
+def etag_matches(header: str, etag: str) -> bool:
+    """Whether an If-None-Match list names our ETag (weak comparison)"""
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def parse_file_info(decoded_data: dict) -> Optional[dict]:
+    """Extract the file properties embedded in a v2+ link"""
+    if decoded_data.get("v", 1) < 2:
+        return None
+    return {
+        "file_size": int(decoded_data["size"]),
+        "mime_type": decoded_data.get("mime") or "",
+        "dc_id": decoded_data.get("dc"),
+        "unique_id": decoded_data.get("uid"),
+    }
+
+
 async def media_streamer(
     request: Request,
     chat_id: int,
     id: int,
-    secure_hash: str,
-) -> StreamingResponse:
+    secure_hash: Optional[str] = None,
+    file_info: Optional[dict] = None,
+    name: str = "",
+) -> Response:
     """
     Stream media file from Telegram
     Supports byte-range requests for seeking/resuming
+    HEAD, empty and 304 responses are answered from metadata alone; a body
+    is only promised once the file is known to exist and match the link
     """
     range_header = request.headers.get("Range", "")
-    
-    # Get the least loaded worker bot
-    index = get_least_loaded_bot()
-    if index is None:
-        raise HTTPException(status_code=503, detail="No worker bots available")
-    
-    faster_client = WorkerBots[index]
 
-    # Get or create ByteStreamer instance
-    tg_connect = class_cache.get(index)
-    if not tg_connect:
-        tg_connect = ByteStreamer(faster_client)
-        class_cache[index] = tg_connect
-
-    # Get file properties
-    try:
-        file_id = await tg_connect.get_file_properties(chat_id=chat_id, message_id=id)
-    except Exception as e:
-        LOGGER.error(f"Error getting file properties: {e}", exc_info=True)
-        raise HTTPException(status_code=404, detail=f"File not found: {e}")
-    
-    # Validate file hash
-    if file_id.unique_id[:6] != secure_hash:
-        raise HTTPException(status_code=403, detail="Invalid file hash")
+    file_id = None
+    if file_info:
+        # Properties come from the link; the file ID is only needed for a body
+        file_size = file_info["file_size"]
+        file_name = name
+        mime_type = file_info["mime_type"]
+        dc_id = file_info["dc_id"]
+        unique_id = file_info["unique_id"]
+    else:
+        # Get file properties
+        file_id = await find_file(chat_id, id, secure_hash)
+        file_size = file_id.file_size
+        file_name = file_id.file_name
+        mime_type = file_id.mime_type
+        dc_id = file_id.dc_id
+        unique_id = file_id.unique_id
 
-    file_size = file_id.file_size
-    from_bytes, until_bytes = parse_range_header(range_header, file_size)
+    # Older links don't carry the unique ID the validator is derived from
+    if unique_id is None:
+        file_id = await find_file(chat_id, id, secure_hash)
+        unique_id = file_id.unique_id
+    etag = f'"{unique_id}"'
 
-    # Calculate chunk parameters
-    chunk_size = 1024 * 1024  # 1MB chunks
-    offset = from_bytes - (from_bytes % chunk_size)
-    first_part_cut = from_bytes - offset
-    last_part_cut = (until_bytes % chunk_size) + 1
-    req_length = until_bytes - from_bytes + 1
-    part_count = math.ceil(until_bytes / chunk_size) - math.floor(offset / chunk_size)
+    # Conditional requests (RFC 7232): revalidations never touch a worker
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={
+            "ETag": etag,
+            "Cache-Control": "public, max-age=3600, immutable",
+            "Access-Control-Allow-Origin": "*",
+        })
+    
+    # A range is only served if the client's partial copy is still current
+    if_range = request.headers.get("If-Range")
+    if range_header and if_range and if_range.strip() != etag:
+        range_header = ""
 
-    # Log streaming parameters for debugging
-    LOGGER.info(f"📡 Streaming request: {from_bytes}-{until_bytes} of {file_size} bytes ({req_length} bytes expected)")
-    LOGGER.debug(f"   Chunk size: {chunk_size}, Offset: {offset}, Parts: {part_count}")
-    LOGGER.debug(f"   First cut: {first_part_cut}, Last cut: {last_part_cut}")
-
-    # Stream the file
-    body = tg_connect.yield_file(
-        file_id, index, offset, first_part_cut, last_part_cut, part_count, chunk_size
-    )
+    ranges = parse_range_header(range_header, file_size)
+    partial = ranges is not None
+    if not partial:
+        ranges = [(0, file_size - 1)]
+    req_length = sum(until_bytes - from_bytes + 1 for from_bytes, until_bytes in ranges)
 
     # Determine filename and MIME type
-    file_name = file_id.file_name or f"{secrets.token_hex(2)}.unknown"
-    mime_type = file_id.mime_type or mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+    has_name = bool(file_name)
+    file_name = file_name or f"{secrets.token_hex(2)}.unknown"
+    mime_type = mime_type or mimetypes.guess_type(file_name)[0] or "application/octet-stream"
     
-    if not file_id.file_name and "/" in mime_type:
+    if not has_name and "/" in mime_type:
         file_name = f"{secrets.token_hex(2)}.{mime_type.split('/')[1]}"
 
     # Build response headers - SAME as Telegram-Stremio
@@ -180,24 +357,301 @@ async def media_streamer(
         "Content-Disposition": f'inline; filename="{file_name}"',
         "Accept-Ranges": "bytes",
         "Cache-Control": "public, max-age=3600, immutable",
+        "ETag": etag,
         "Access-Control-Allow-Origin": "*",
-        "Access-Control-Expose-Headers": "Content-Length, Content-Range, Accept-Ranges",
+        "Access-Control-Expose-Headers": "Content-Length, Content-Range, Accept-Ranges, ETag",
     }
     
-    if range_header:
-        headers["Content-Range"] = f"bytes {from_bytes}-{until_bytes}/{file_size}"
+    boundary = None
+    if partial and len(ranges) > 1:
+        # Several ranges go out as one multipart/byteranges body
+        boundary = secrets.token_hex(12)
+        req_length += sum(len(part) for part in multipart_frames(ranges, boundary, mime_type, file_size))
+        headers["Content-Type"] = f"multipart/byteranges; boundary={boundary}"
+        headers["Content-Length"] = str(req_length)
+        status_code = 206
+    elif partial:
+        headers["Content-Range"] = f"bytes {ranges[0][0]}-{ranges[0][1]}/{file_size}"
         status_code = 206
     else:
         status_code = 200
+
+    # Probes need no worker, admission slot or body generator
+    if request.method == "HEAD" or req_length <= 0:
+        return Response(status_code=status_code, headers=headers)
+
+    # Peer mode: the file's owner on the ring serves it, so it is cached on one node
+    # The owner follows from the unique ID, so other nodes never look the file up
+    if peers.enabled and not peers.is_forwarded(request):
+        owner_url = peers.owner_url(unique_id)
+        if owner_url:
+            response = await peers.forward(request, owner_url, client_ip(request))
+            if response is not None:
+                return response
+
+    # Check the file before sending headers, so dead or forged links get
+    # a 404/403 instead of an empty 200 (cache first, a lookup only on a miss)
+    if file_id is None:
+        file_id = await find_file(chat_id, id, secure_hash)
+
+    # Take a stream slot on the worker expected to serve this file fastest
+    ticket = await admit_stream(request, dc_id, link=str(id))
+
+    # Calculate chunk parameters (1MB parts, smaller for short reads)
+    # Every range must be servable from parts of the same size
+    chunk_size = max(choose_chunk_size(from_bytes, until_bytes) for from_bytes, until_bytes in ranges)
+
+    # Log streaming parameters for debugging
+    spans = ", ".join(f"{from_bytes}-{until_bytes}" for from_bytes, until_bytes in ranges)
+    LOGGER.info(f"📡 Streaming request: {spans} of {file_size} bytes ({req_length} bytes expected)")
+    LOGGER.debug(f"   Chunk size: {chunk_size}, Parts: {len(plan_ranges(ranges, chunk_size)[0])}")
+
+    # Stream the file
+    body = stream_file(ticket, chat_id, id, secure_hash, ranges, chunk_size, client=tuple(request.client) if request.client else None)
+    if boundary:
+        body = multipart_body(body, ranges, boundary, mime_type, file_size)
     
     return StreamingResponse(
         status_code=status_code,
         content=body,
         headers=headers,
-        media_type=mime_type,
+        media_type=headers["Content-Type"],
+        background=BackgroundTask(ticket.release),
     )
 
 
+def multipart_frames(ranges: List[Tuple[int, int]], boundary: str, mime_type: str, file_size: int) -> List[bytes]:
+    """
+    Delimiters and part headers of a multipart/byteranges body
+    Frame i goes before range i; the last frame closes the body
+    """
+    frames = []
+    for i, (from_bytes, until_bytes) in enumerate(ranges):
+        delimiter = "\r\n" if i else ""
+        frames.append((
+            f"{delimiter}--{boundary}\r\n"
+            f"Content-Type: {mime_type}\r\n"
+            f"Content-Range: bytes {from_bytes}-{until_bytes}/{file_size}\r\n\r\n"
+        ).encode())
+    frames.append(f"\r\n--{boundary}--\r\n".encode())
+    return frames
+
+
+async def multipart_body(body, ranges: List[Tuple[int, int]], boundary: str, mime_type: str, file_size: int):
+    """Wrap the back-to-back bytes of several ranges in multipart/byteranges framing"""
+    frames = multipart_frames(ranges, boundary, mime_type, file_size)
+    try:
+        for (from_bytes, until_bytes), frame in zip(ranges, frames):
+            yield frame
+            left = until_bytes - from_bytes + 1
+            while left > 0:
+                try:
+                    chunk = await body.__anext__()
+                except StopAsyncIteration:
+                    return
+                left -= len(chunk)
+                yield chunk
+        yield frames[-1]
+    finally:
+        await body.aclose()
+
+
+async def pick_worker(dc_id: Optional[int] = None) -> int:
+    """
+    Ask the scheduler for a worker bot, preferring ones with a session on the DC
+    While the bots are still starting, waits for the first one to come up
+    """
+    index = scheduler.pick(dc_id)
+    if index is None and not startup.finished:
+        try:
+            await asyncio.wait_for(startup.first_worker.wait(), Config.ADMISSION_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        index = scheduler.pick(dc_id)
+    if index is None:
+        raise HTTPException(
+            status_code=503,
+            detail="No worker bots available",
+            headers={"Retry-After": str(Config.RETRY_AFTER)},
+        )
+    return index
+
+
+@lru_cache(maxsize=1024)
+def is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def client_ip(request: Request) -> str:
+    """
+    Client address, as forwarded by a reverse proxy when there is one
+    X-Real-IP is only believed from TRUSTED_PROXIES; from anyone else a new
+    value per request would buy a fresh place in the fair queue
+    """
+    host = request.client.host if request.client else "unknown"
+    forwarded = request.headers.get("X-Real-IP")
+    if forwarded and is_trusted_proxy(host):
+        return forwarded
+    return host
+
+
+async def admit_stream(request: Request, dc_id: Optional[int], link: str) -> Ticket:
+    """
+    Get a stream slot from the admission controller
+    Waits in a fair per-client queue when every worker is full, and answers
+    503 with Retry-After when the queue is full or the wait is too long
+    """
+    await pick_worker(dc_id)
+    if dc_id is not None:
+        seen_dcs.add(dc_id)
+    
+    key = link if Config.ADMISSION_FAIR_KEY == "link" else client_ip(request)
+    try:
+        return await admission.admit(key, dc_id)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many active streams, please retry",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
+async def resolve_file(tg_connect: ByteStreamer, chat_id: int, message_id: int, secure_hash: Optional[str]):
+    """Get the file ID for a message and check it against the link's hash"""
+    try:
+        file_id = await tg_connect.get_file_properties(chat_id=chat_id, message_id=message_id)
+    except Exception as e:
+        LOGGER.error(f"Error getting file properties: {e}", exc_info=True)
+        raise HTTPException(status_code=404, detail=f"File not found: {e}")
+    
+    check_hash(file_id, secure_hash)
+    return file_id
+
+
+async def find_file(chat_id: int, message_id: int, secure_hash: Optional[str]):
+    """File ID from the local or shared cache, looked up through a worker only on a miss"""
+    file_id = await cached_file_properties(chat_id, message_id)
+    if file_id is None:
+        return await resolve_file(get_byte_streamer(await pick_worker()), chat_id, message_id, secure_hash)
+    
+    check_hash(file_id, secure_hash)
+    return file_id
+
+
+def check_hash(file_id, secure_hash: Optional[str]) -> None:
+    """Validate file hash when the link carries one"""
+    if secure_hash and file_id.unique_id[:6] != secure_hash:
+        raise HTTPException(status_code=403, detail="Invalid file hash")
+
+
+async def stream_file(
+    ticket: Ticket,
+    chat_id: int,
+    message_id: int,
+    secure_hash: Optional[str],
+    ranges: List[Tuple[int, int]],
+    chunk_size: int,
+    client: Optional[Tuple[str, int]] = None
+):
+    """
+    Response body for one or more byte ranges, sent back to back
+    The file ID comes from the shared cache, falling back to a lookup on a miss
+    All ranges are planned together so parts they share are fetched once
+    If a worker fails mid-stream, the rest of the ranges are resumed from the
+    exact byte on another worker so the client still gets the full body
+    The admission ticket is released when the body ends
+    Read-ahead is capped by how fast the client drains the body; a client that
+    stops reading has its worker slot freed until it comes back, and its
+    connection closed once it has been idle for STREAM_IDLE_TIMEOUT
+    """
+    index = ticket.index
+    remaining = list(ranges)
+    failed = set()
+    failovers = 0
+    watch = monitor.watch(ticket, (lambda: drop_connection(client)) if client else None)
+    
+    try:
+        while remaining:
+            tg_connect = get_byte_streamer(index)
+            try:
+                file_id = await resolve_file(tg_connect, chat_id, message_id, secure_hash)
+            except HTTPException as e:
+                LOGGER.error(f"❌ Could not start stream for message {message_id}: {e.detail}")
+                return
+            
+            parts, slices = plan_ranges(remaining, chunk_size)
+
+            # Stream the file, striped across several workers for large ranges
+            lanes = get_stripe_lanes(index, file_id, len(parts))
+            if len(lanes) > 1:
+                LOGGER.debug(f"   Striping over workers: {[lane[0] for lane in lanes]}")
+                body = yield_file_striped(lanes, parts, slices, chunk_size, watch.window_cap)
+            else:
+                body = tg_connect.yield_file(file_id, index, parts, slices, chunk_size, watch.window_cap)
+            watch.body = body
+            
+            try:
+                async for chunk in body:
+                    # Slices never cross ranges, so this tracks the exact byte to resume from
+                    from_bytes, until_bytes = remaining[0]
+                    if from_bytes + len(chunk) > until_bytes:
+                        remaining.pop(0)
+                    else:
+                        remaining[0] = (from_bytes + len(chunk), until_bytes)
+                    watch.before_yield()
+                    yield chunk
+                    if watch.after_yield(len(chunk)):
+                        if watch.aborted:
+                            # The idle connection was closed; nothing more can be sent
+                            return
+                        # The body was closed while the client stalled; restart from here
+                        await watch.resume()
+                        break
+                else:
+                    return
+            except WorkerUnavailable as e:
+                position = remaining[0][0]
+                failed.add(e.index)
+                failovers += 1
+                if failovers > Config.STREAM_MAX_FAILOVERS:
+                    LOGGER.error(f"❌ Giving up on message {message_id} at byte {position}: {e}")
+                    return
+                
+                index = await failover_worker(file_id.dc_id, failed)
+                if index is None:
+                    LOGGER.error(f"❌ No worker left to resume message {message_id} at byte {position}: {e}")
+                    return
+                ticket.move(index)
+                LOGGER.warning(f"🔀 {e}; resuming message {message_id} at byte {position} on worker {index}")
+    finally:
+        monitor.unwatch(watch)
+        await watch.close()
+        ticket.release()
+
+
+async def failover_worker(dc_id: int, failed: set) -> Optional[int]:
+    """
+    Next worker for a failed stream
+    Prefers workers that haven't failed it; otherwise waits out a short cooldown
+    """
+    index = scheduler.pick(dc_id, exclude=failed)
+    if index is None:
+        index = scheduler.pick(dc_id)
+    if index is None:
+        return None
+    
+    wait = scheduler.worker_stats(index).cooldown_until - time.monotonic()
+    if wait > Config.FAILOVER_MAX_WAIT:
+        return None
+    if wait > 0:
+        await asyncio.sleep(wait)
+    return index
+
+
 def get_readable_file_size(size_in_bytes):
     """Convert bytes to human-readable format"""
     size_in_bytes = int(size_in_bytes) if str(size_in_bytes).isdigit() else 0
@@ -214,6 +668,7 @@ def get_readable_file_size(size_in_bytes):
 
 def start_server():
     """Create and return uvicorn server instance"""
+    global http_server
     config = uvicorn.Config(
         app=app, 
         host='0.0.0.0', 
@@ -221,4 +676,50 @@ def start_server():
         log_level="error",  # Reduce noise
         access_log=False
     )
-    return uvicorn.Server(config)
+    http_server = uvicorn.Server(config)
+    return http_server
+
+
+def drop_connection(client: Tuple[str, int]) -> bool:
+    """
+    Reset the connection of an idle client
+    uvicorn then treats it as a client disconnect, so the response ends
+    without errors; a zero linger drops what the kernel still buffers instead
+    of trickling it out to a client that isn't reading
+    """
+    if http_server is None:
+        return False
+    for connection in list(http_server.server_state.connections):
+        if getattr(connection, "client", None) == client:
+            sock = connection.transport.get_extra_info("socket")
+            if sock is not None:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            connection.transport.abort()
+            return True
+    return False
+
+
+def listen_sockets() -> Optional[list]:
+    """
+    Listening sockets when running as one of several nodes
+    Each process binds PORT with SO_REUSEPORT and the kernel spreads
+    connections between them, plus NODE_PORT for peer traffic when set;
+    a single process lets uvicorn bind as usual
+    """
+    if Config.WORKER_PROCESSES <= 1 and Config.NODE_COUNT <= 1:
+        return None
+    
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(('0.0.0.0', Config.PORT))
+    sockets = [sock]
+    
+    # Peers need an address that reaches this node and not its neighbours
+    if Config.NODE_PORT:
+        own = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        own.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        own.bind(('0.0.0.0', Config.NODE_PORT))
+        sockets.append(own)
+    return sockets
@@ -0,0 +1,125 @@
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+from cache import MetadataCache
+from config import Config
+from logger import LOGGER
+
+
+class SharedState(ABC):
+    """
+    State shared between the nodes (processes or hosts) serving one bot
+    Holds each node's heartbeat info (worker loads, address) and the resolved
+    file properties so a message is looked up once for the whole cluster
+    A network store only has to implement these four calls
+    """
+    
+    @abstractmethod
+    async def publish_node(self, node: int, info: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    async def nodes(self) -> Dict[int, Dict[str, Any]]:
+        """Nodes that sent a heartbeat recently"""
+
+    @abstractmethod
+    async def get_file(self, key: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def set_file(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        ...
+
+    @staticmethod
+    def node_ttl() -> float:
+        return Config.NODE_HEARTBEAT * 3
+
+
+class MemoryState(SharedState):
+    """
+    Single-process stand-in; nothing is shared beyond this process
+    File entries live in an LRU bounded like the file cache, so heavy link
+    churn can't grow the process past FILE_CACHE_SIZE entries here either
+    """
+    
+    def __init__(self, max_files: int = Config.FILE_CACHE_SIZE):
+        self._nodes: Dict[int, tuple] = {}
+        self._files = MetadataCache(max_files, Config.FILE_CACHE_TTL)
+
+    async def publish_node(self, node: int, info: Dict[str, Any]) -> None:
+        self._nodes[node] = (time.time(), info)
+
+    async def nodes(self) -> Dict[int, Dict[str, Any]]:
+        cutoff = time.time() - self.node_ttl()
+        return {node: info for node, (seen, info) in self._nodes.items() if seen > cutoff}
+
+    async def get_file(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._files.get(key)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    async def set_file(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        self._files.set(key, (time.time() + ttl, value))
+
+
+class SQLiteState(SharedState):
+    """
+    Shared state in a local SQLite database
+    Enough for several processes on one host; queries run in a thread so the
+    event loop never waits on the database lock
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS nodes (node INTEGER PRIMARY KEY, info TEXT, seen REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS files (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+
+    def _query(self, sql: str, *args) -> list:
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+    async def publish_node(self, node: int, info: Dict[str, Any]) -> None:
+        await asyncio.to_thread(
+            self._query, "REPLACE INTO nodes VALUES (?, ?, ?)", node, json.dumps(info), time.time()
+        )
+
+    async def nodes(self) -> Dict[int, Dict[str, Any]]:
+        rows = await asyncio.to_thread(
+            self._query, "SELECT node, info FROM nodes WHERE seen > ?", time.time() - self.node_ttl()
+        )
+        return {node: json.loads(info) for node, info in rows}
+
+    async def get_file(self, key: str) -> Optional[Dict[str, Any]]:
+        rows = await asyncio.to_thread(
+            self._query, "SELECT value FROM files WHERE key = ? AND expires > ?", key, time.time()
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    async def set_file(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        await asyncio.to_thread(
+            self._query, "REPLACE INTO files VALUES (?, ?, ?)", key, json.dumps(value), time.time() + ttl
+        )
+        self._writes += 1
+        if self._writes % 256 == 0:
+            # Expired rows are cleared now and then rather than on every write
+            await asyncio.to_thread(self._query, "DELETE FROM files WHERE expires <= ?", time.time())
+
+
+def create_shared_state() -> SharedState:
+    if Config.SHARED_STATE == "sqlite":
+        return SQLiteState(Config.SHARED_STATE_PATH)
+    if Config.SHARED_STATE != "memory":
+        LOGGER.warning(f"⚠️ Unknown SHARED_STATE {Config.SHARED_STATE!r}, using memory")
+    return MemoryState()
+
+
+shared_state = create_shared_state()
@@ -0,0 +1,43 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one
+    The first caller starts the call, later callers wait for its result
+    The call is cancelled only when every waiter has gone away
+    """
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, List] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``fn`` for ``key`` unless an identical call is already in flight"""
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(fn())
+            entry = self._calls[key] = [task, 0]
+            task.add_done_callback(lambda _, entry=entry: self._forget(key, entry))
+            self.calls += 1
+        else:
+            self.shared += 1
+        
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                task.cancel()
+
+    def _forget(self, key: Hashable, entry: List) -> None:
+        """Drop a finished call so the next caller starts a fresh one"""
+        if self._calls.get(key) is entry:
+            del self._calls[key]
+
+    def __len__(self) -> int:
+        return len(self._calls)
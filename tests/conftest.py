@@ -0,0 +1,118 @@
+import asyncio
+import types
+
+import pytest
+from pyrogram import raw
+from pyrogram.errors import FileReferenceExpired
+from pyrogram.file_id import FileId, FileType
+from starlette.testclient import TestClient
+
+import bot
+import byte_streamer
+import server
+from byte_streamer import ByteStreamer
+from cache import ChunkCache, DiskChunkCache, MetadataCache
+from config import Config
+from encrypt import encode_link, parse_link
+from scheduler import scheduler
+from shared_state import MemoryState
+
+SIZE = 5 * 1024 * 1024 + 12345
+DATA = bytes((i * 7 + i // 997) % 256 for i in range(SIZE))
+CHAT_ID = -1002318728082
+UNIQUE_ID = "AgADxQ8AAo3NQFU"
+
+
+def link(message_id, uid=UNIQUE_ID):
+    """Download path of an unsigned link to a message in the dump channel"""
+    token = encode_link({"msg_id": message_id, "chat_id": "2318728082", "size": SIZE, "mime": "video/mp4", "dc": 4, "uid": uid})
+    return f"/dl/{token}/movie.mp4"
+
+
+def make_file_id(chat_id=CHAT_ID, message_id=1, unique_id=UNIQUE_ID, file_reference=b"ref"):
+    file_id = FileId(file_type=FileType.DOCUMENT, dc_id=4, media_id=1, access_hash=2, file_reference=file_reference)
+    file_id.file_name = "movie.mp4"
+    file_id.file_size = SIZE
+    file_id.mime_type = "video/mp4"
+    file_id.unique_id = unique_id
+    file_id.message_ref = (chat_id, message_id)
+    return file_id
+
+
+class FakeSession:
+    """Media session answering GetFile from DATA, for the current file reference only"""
+    
+    def __init__(self, telegram, index):
+        self.telegram = telegram
+        self.index = index
+    
+    async def send(self, query):
+        self.telegram.get_file += 1
+        await asyncio.sleep(0)
+        if query.location.file_reference != self.telegram.file_reference:
+            raise FileReferenceExpired()
+        data = DATA[query.offset:query.offset + query.limit]
+        return raw.types.upload.File(type=raw.types.storage.FileUnknown(), mtime=0, bytes=data)
+
+
+class FakeTelegram:
+    """Messages known to the fake workers, and the calls made to fetch them"""
+    
+    def __init__(self):
+        self.messages = {}
+        self.get_messages = 0
+        self.get_file = 0
+        self.sessions = 0
+        self.file_reference = b"ref"
+    
+    def add(self, message_id, unique_id=UNIQUE_ID):
+        self.messages[(CHAT_ID, message_id)] = unique_id
+
+
+@pytest.fixture
+def telegram(monkeypatch):
+    """
+    Two fake worker bots backed by an in-memory file
+    Caches and shared state start empty for every test
+    """
+    fake = FakeTelegram()
+    
+    async def get_file_ids(self, chat_id, message_id):
+        fake.get_messages += 1
+        await asyncio.sleep(0)
+        if (chat_id, message_id) not in fake.messages:
+            raise Exception("Message not found or empty")
+        return make_file_id(chat_id, message_id, fake.messages[(chat_id, message_id)], fake.file_reference)
+    
+    async def generate_media_session(self, client, file_id):
+        fake.sessions += 1
+        return FakeSession(fake, self.index)
+    
+    monkeypatch.setattr(ByteStreamer, "_get_file_ids", get_file_ids)
+    monkeypatch.setattr(ByteStreamer, "generate_media_session", generate_media_session)
+    monkeypatch.setattr(byte_streamer, "file_cache", MetadataCache(100, 60))
+    monkeypatch.setattr(byte_streamer, "memory_cache", ChunkCache(64 * 1024 * 1024))
+    monkeypatch.setattr(byte_streamer, "disk_cache", DiskChunkCache("", 0))
+    shared = MemoryState()
+    monkeypatch.setattr(byte_streamer, "shared_state", shared)
+    monkeypatch.setattr(server, "shared_state", shared)
+    monkeypatch.setattr(Config, "STRIPED_DOWNLOAD", False)
+    monkeypatch.setattr(server.peers, "mode", "off")
+    monkeypatch.setattr(scheduler, "stats", {})
+    
+    server.class_cache.clear()
+    for index in range(2):
+        bot.WorkerBots[index] = types.SimpleNamespace(name=f"worker_{index}", media_sessions={})
+        bot.WorkLoads[index] = 0
+    yield fake
+    bot.WorkerBots.clear()
+    bot.WorkLoads.clear()
+    server.class_cache.clear()
+
+
+@pytest.fixture
+def client(telegram, monkeypatch):
+    monkeypatch.setattr(Config, "LINK_SECRET", "")
+    parse_link.cache_clear()
+    with TestClient(server.app) as client:
+        yield client
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+import bot
+from admission import AdmissionController, Overloaded
+
+
+@pytest.fixture
+def worker():
+    bot.WorkerBots[0] = object()
+    bot.WorkLoads[0] = 0
+    yield
+    bot.WorkerBots.clear()
+    bot.WorkLoads.clear()
+
+
+async def settle():
+    """Let queued admits and their wait_for wrappers run"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def queue(controller, key, count):
+    return [asyncio.ensure_future(controller.admit(key)) for _ in range(count)]
+
+
+def test_per_client_limit_rejects_only_that_client(worker):
+    async def run():
+        controller = AdmissionController(1, max_queue=10, max_wait=5, retry_after=1, per_key=2)
+        ticket = await controller.admit("busy")
+        busy = queue(controller, "busy", 2)
+        await settle()
+        
+        with pytest.raises(Overloaded):
+            await controller.admit("busy")
+        quiet = queue(controller, "quiet", 1)
+        await settle()
+        assert controller.queued == 3 and controller.rejected == 1
+        
+        # Round-robin: the quiet client is served right after the busy one's first request
+        ticket.release()
+        await settle()
+        busy[0].result().release()
+        await settle()
+        assert quiet[0].done() and not busy[1].done()
+        quiet[0].result().release()
+        await settle()
+        busy[1].result().release()
+    
+    asyncio.run(run())
+
+
+def test_full_queue_sheds_the_busiest_client_first(worker):
+    async def run():
+        controller = AdmissionController(1, max_queue=3, max_wait=5, retry_after=1, per_key=0)
+        ticket = await controller.admit("busy")
+        busy = queue(controller, "busy", 3)
+        await settle()
+        
+        quiet = queue(controller, "quiet", 1)
+        await settle()
+        assert isinstance(busy[2].exception(), Overloaded)
+        assert not quiet[0].done() and controller.queued == 3
+        
+        # Now both clients queue evenly, so a newcomer is refused instead
+        with pytest.raises(Overloaded):
+            await controller.admit("quiet")
+        assert controller.rejected == 2
+        
+        ticket.release()
+        for _ in range(3):
+            await settle()
+            waiting = next(future for future in busy[:2] + quiet if future.done() and not future.result().released)
+            waiting.result().release()
+        assert controller.queued == 0
+    
+    asyncio.run(run())
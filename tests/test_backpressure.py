@@ -0,0 +1,71 @@
+import asyncio
+
+import bot
+import server
+from admission import admission
+from backpressure import monitor
+from tests.conftest import CHAT_ID, DATA, SIZE
+
+CHUNK = 1024 * 1024
+CLIENT = ("203.0.113.7", 50000)
+
+
+async def open_stream(message_id=1):
+    ticket = await admission.admit("test")
+    body = server.stream_file(ticket, CHAT_ID, message_id, None, [(0, SIZE - 1)], CHUNK, client=CLIENT)
+    first = await body.__anext__()
+    watch = next(watch for watch in monitor.streams if watch.ticket is ticket)
+    return ticket, body, first, watch
+
+
+def test_stall_frees_slot_and_resumes(telegram):
+    telegram.add(1)
+    
+    async def run():
+        ticket, body, first, watch = await open_stream()
+        watch.stall()
+        await asyncio.sleep(0)
+        assert admission.stats()["stalled"] == 1 and admission.active[ticket.index] == 0
+        
+        rest = [bytes(chunk) async for chunk in body]
+        assert bytes(first) + b"".join(rest) == DATA
+        assert admission.stats()["stalled"] == 0 and ticket.released
+    
+    asyncio.run(run())
+    assert all(load == 0 for load in bot.WorkLoads.values())
+
+
+def test_idle_abort_closes_connection(telegram, monkeypatch):
+    telegram.add(1)
+    dropped = []
+    monkeypatch.setattr(server, "drop_connection", lambda client: dropped.append(client) or True)
+    
+    async def run():
+        ticket, body, first, watch = await open_stream()
+        assert watch.abort()
+        assert dropped == [CLIENT]
+        await asyncio.sleep(0)
+        assert admission.active[ticket.index] == 0
+        
+        # The connection is gone, so the body just ends
+        assert [chunk async for chunk in body] == [] and ticket.released
+        assert admission.stats()["stalled"] == 0
+    
+    asyncio.run(run())
+    assert all(load == 0 for load in bot.WorkLoads.values())
+
+
+def test_idle_client_that_cant_be_closed_resumes_in_full(telegram):
+    telegram.add(1)
+    
+    async def run():
+        ticket, body, first, watch = await open_stream()
+        # No uvicorn server here, so the connection can't be found
+        assert not watch.abort()
+        assert watch.disconnect is None
+        
+        rest = [bytes(chunk) async for chunk in body]
+        assert bytes(first) + b"".join(rest) == DATA
+        assert ticket.released
+    
+    asyncio.run(run())
@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import bot
+import byte_streamer
+from byte_streamer import ByteStreamer
+from cache import ChunkCache
+from config import Config
+from scheduler import scheduler
+from tests.conftest import CHAT_ID, DATA, FakeSession, link, make_file_id
+
+EVICTED_FROM = 4 * 1024 * 1024
+
+
+def test_cached_stream_opens_no_session(client, telegram):
+    telegram.add(1)
+    assert client.get(link(1)).content == DATA
+    sessions, get_file = telegram.sessions, telegram.get_file
+    
+    assert client.get(link(1)).content == DATA
+    assert (telegram.sessions, telegram.get_file) == (sessions, get_file)
+
+
+def test_part_evicted_mid_stream_is_fetched(client, telegram, monkeypatch):
+    telegram.add(1)
+    assert client.get(link(1)).content == DATA
+    sessions, get_file = telegram.sessions, telegram.get_file
+    
+    cache_get = byte_streamer.memory_cache.get
+    
+    def evicting_get(unique_id, offset, limit):
+        # The stream starts from the cache, then finds its later parts gone
+        if offset >= EVICTED_FROM:
+            return None
+        return cache_get(unique_id, offset, limit)
+    
+    monkeypatch.setattr(byte_streamer.memory_cache, "get", evicting_get)
+    response = client.get(link(1))
+    assert response.content == DATA
+    assert telegram.sessions == sessions + 1
+    assert telegram.get_file == get_file + 2
+
+
+def test_striped_stream_with_evicted_parts(client, telegram, monkeypatch):
+    monkeypatch.setattr(Config, "STRIPED_DOWNLOAD", True)
+    monkeypatch.setattr(Config, "STRIPE_MIN_PARTS", 2)
+    monkeypatch.setattr(Config, "STRIPE_PARTS", 1)
+    telegram.add(1)
+    assert client.get(link(1)).content == DATA
+    
+    cache_get = byte_streamer.memory_cache.get
+    monkeypatch.setattr(
+        byte_streamer.memory_cache, "get",
+        lambda unique_id, offset, limit: None if offset >= EVICTED_FROM else cache_get(unique_id, offset, limit),
+    )
+    assert client.get(link(1)).content == DATA
+
+
+def test_expired_reference_is_refreshed_once(client, telegram, monkeypatch):
+    telegram.add(1)
+    assert client.get(link(1)).content == DATA
+    get_messages = telegram.get_messages
+    
+    telegram.file_reference = b"fresh"
+    monkeypatch.setattr(byte_streamer, "memory_cache", ChunkCache(64 * 1024 * 1024))
+    assert client.get(link(1)).content == DATA
+    # Every part in flight hit the expired reference, but the message was fetched again only once
+    assert telegram.get_messages == get_messages + 1
+    assert byte_streamer.file_cache.get((CHAT_ID, 1)).file_reference == b"fresh"
+
+
+def test_refresh_after_another_part_already_did(telegram):
+    telegram.add(1)
+    
+    async def run():
+        streamer = ByteStreamer(bot.WorkerBots[0], 0)
+        file_id = make_file_id()
+        location = await ByteStreamer.get_location(file_id)
+        
+        # Another part refreshed the file ID and the shared location while this one was in flight
+        file_id.file_reference = location.file_reference = b"fresh"
+        await streamer.refresh_file_reference(file_id, location, b"ref")
+        assert telegram.get_messages == 0
+        assert location.file_reference == b"fresh"
+    
+    asyncio.run(run())
+
+
+def test_striped_lanes_share_one_lookup(client, telegram, monkeypatch):
+    monkeypatch.setattr(Config, "STRIPED_DOWNLOAD", True)
+    monkeypatch.setattr(Config, "STRIPE_MIN_PARTS", 2)
+    monkeypatch.setattr(Config, "STRIPE_PARTS", 1)
+    telegram.add(1)
+    assert client.get(link(1)).content == DATA
+    # Both workers fetched parts with the one file ID looked up for the request
+    assert telegram.get_messages == 1 and telegram.sessions == 2
+
+
+def test_worker_failure_resumes_on_another(client, telegram, monkeypatch):
+    telegram.add(1)
+    send = FakeSession.send
+    served = []
+    
+    async def flaky_send(session, query):
+        # The first worker to serve the stream times out after 2MB
+        served.append(session.index)
+        if session.index == served[0] and query.offset >= 2 * 1024 * 1024:
+            raise TimeoutError()
+        return await send(session, query)
+    
+    monkeypatch.setattr(FakeSession, "send", flaky_send)
+    assert client.get(link(1)).content == DATA
+    failed = served[0]
+    assert set(served) == {0, 1}
+    assert scheduler.worker_stats(failed).in_cooldown(time.monotonic())
+    assert all(load == 0 for load in bot.WorkLoads.values())
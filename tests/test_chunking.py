@@ -0,0 +1,50 @@
+import pytest
+
+from byte_streamer import MAX_CHUNK_SIZE, MIN_CHUNK_SIZE, choose_chunk_size, plan_ranges, slice_part
+from tests.conftest import DATA
+
+MB = 1024 * 1024
+
+READS = {
+    "probe": ((0, 0), 4096),
+    "first-page": ((0, 4095), 4096),
+    "straddles-4k": ((4000, 4200), 8192),
+    "straddles-1mb": ((MB - 10, MB + 10), 4096),
+    "two-pages-over-1mb": ((MB - 4096, MB + 4095), 4096),
+    "moov-small": ((100, 40000), 65536),
+    "moov-tail": ((5 * MB - 300000, 5 * MB - 1), 512 * 1024),
+    "mid-file": ((1234567, 1234567 + 64 * 1024), 128 * 1024),
+    "large": ((0, 5 * MB - 1), MB),
+    "large-unaligned": ((3 * MB + 5, 5 * MB), MB),
+}
+
+
+@pytest.mark.parametrize("read, expected", READS.values(), ids=READS.keys())
+def test_choose_chunk_size(read, expected):
+    assert choose_chunk_size(*read) == expected
+
+
+@pytest.mark.parametrize("read", [read for read, _ in READS.values()], ids=READS.keys())
+def test_planned_parts_are_valid_get_file_requests(read):
+    chunk_size = choose_chunk_size(*read)
+    # GetFile limits: a power of two, 4KB aligned, dividing 1MB
+    assert MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE
+    assert chunk_size & (chunk_size - 1) == 0 and MAX_CHUNK_SIZE % chunk_size == 0
+    
+    parts, slices = plan_ranges([read], chunk_size)
+    for offset in parts:
+        assert offset % MIN_CHUNK_SIZE == 0 and offset % chunk_size == 0
+        assert offset // MAX_CHUNK_SIZE == (offset + chunk_size - 1) // MAX_CHUNK_SIZE
+    if read[1] - read[0] < MAX_CHUNK_SIZE // 2:
+        assert len(parts) <= 2
+    
+    body = b"".join(
+        bytes(slice_part(DATA[parts[part]:parts[part] + chunk_size], start, end)) for part, start, end in slices
+    )
+    assert body == DATA[read[0]:read[1] + 1]
+
+
+def test_ranges_sharing_a_part_fetch_it_once():
+    parts, slices = plan_ranges([(0, 99), (200, 299), (MB + 1, MB + 2)], MB)
+    assert parts == [0, MB]
+    assert slices == [(0, 0, 100), (0, 200, 300), (1, 1, 3)]
@@ -0,0 +1,123 @@
+import base64
+import time
+
+import pytest
+
+import encrypt
+from config import Config
+from encrypt import LinkRejected, decode_link, encode_link, parse_link
+
+LINK = {"msg_id": 123, "chat_id": "2318728082", "size": 5243657, "mime": "video/mp4", "dc": 4, "uid": "AgADxQ8AAo3NQFU"}
+
+
+@pytest.fixture(autouse=True)
+def link_config(monkeypatch):
+    monkeypatch.setattr(Config, "LINK_SECRET", "")
+    monkeypatch.setattr(Config, "LINK_REQUIRE_SIGNED", False)
+    monkeypatch.setattr(Config, "LINK_REVOKED_USERS", set())
+    parse_link.cache_clear()
+    yield
+    parse_link.cache_clear()
+
+
+def raw_payload(token):
+    body = token[len(encrypt.TOKEN_PREFIX):]
+    return base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+
+
+def make_token(payload):
+    return encrypt.TOKEN_PREFIX + base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def strip_signature(token, msg_id=None):
+    """Rebuild a signed token as an unsigned one, dropping expiry and scope"""
+    payload = raw_payload(token)
+    version, flags, old_msg_id, chat_id, size, dc = encrypt.TOKEN_HEADER.unpack_from(payload)
+    header = encrypt.TOKEN_HEADER.pack(version, 0, msg_id or old_msg_id, chat_id, size, dc)
+    body = payload[encrypt.TOKEN_HEADER.size:-encrypt.MAC_SIZE]
+    if flags & encrypt.FLAG_SCOPED:
+        body = body[:-encrypt.USER.size]
+    if flags & encrypt.FLAG_EXPIRES:
+        body = body[:-encrypt.EXPIRY.size]
+    return make_token(header + body)
+
+
+def test_round_trip():
+    data = decode_link(encode_link(LINK))
+    assert {key: data[key] for key in ("msg_id", "size", "mime", "dc", "uid")} == {
+        "msg_id": 123, "size": 5243657, "mime": "video/mp4", "dc": 4, "uid": "AgADxQ8AAo3NQFU",
+    }
+    assert data["chat_id"] == 2318728082
+    assert data["hash"] == "AgADxQ"
+    assert data["expires"] is None and data["user"] is None
+
+
+def test_custom_mime_round_trip():
+    assert decode_link(encode_link(dict(LINK, mime="text/x-weird")))["mime"] == "text/x-weird"
+
+
+def test_legacy_link_still_decodes():
+    legacy = encrypt.base62_encode(encrypt.compress_data('{"msg_id": 7, "chat_id": 456}'))
+    assert decode_link(legacy) == {"msg_id": 7, "chat_id": 456}
+
+
+def test_legacy_link_rejected_when_signing_required(monkeypatch):
+    monkeypatch.setattr(Config, "LINK_REQUIRE_SIGNED", True)
+    legacy = encrypt.base62_encode(encrypt.compress_data('{"msg_id": 7, "chat_id": 456}'))
+    with pytest.raises(LinkRejected):
+        decode_link(legacy)
+
+
+def test_signed_round_trip(monkeypatch):
+    monkeypatch.setattr(Config, "LINK_SECRET", "secret")
+    token = encode_link(dict(LINK, expires=int(time.time()) + 60, user=42))
+    data = decode_link(token)
+    assert data["msg_id"] == 123 and data["user"] == 42
+
+
+def test_tampered_token_rejected(monkeypatch):
+    monkeypatch.setattr(Config, "LINK_SECRET", "secret")
+    payload = bytearray(raw_payload(encode_link(LINK)))
+    payload[5] ^= 1  # inside msg_id
+    with pytest.raises(LinkRejected):
+        decode_link(make_token(bytes(payload)))
+
+
+def test_flag_stripped_token_rejected(monkeypatch):
+    monkeypatch.setattr(Config, "LINK_SECRET", "secret")
+    expired = encode_link(dict(LINK, expires=int(time.time()) - 1, user=42))
+    with pytest.raises(LinkRejected):
+        decode_link(expired)
+    
+    with pytest.raises(LinkRejected, match="unsigned"):
+        decode_link(strip_signature(expired))
+    with pytest.raises(LinkRejected, match="unsigned"):
+        decode_link(strip_signature(encode_link(LINK), msg_id=999))
+
+
+def test_unsigned_token_accepted_without_secret():
+    assert decode_link(encode_link(LINK))["msg_id"] == 123
+
+
+def test_expired_link_rejected_after_caching():
+    token = encode_link(dict(LINK, expires=int(time.time()) + 1))
+    assert decode_link(token)["expires"]
+    parse_link.cache_clear()
+    token = encode_link(dict(LINK, expires=int(time.time()) - 1))
+    parse_link(token)
+    with pytest.raises(LinkRejected, match="expired"):
+        decode_link(token)
+
+
+def test_revoked_user_rejected(monkeypatch):
+    token = encode_link(dict(LINK, user=42))
+    assert decode_link(token)["user"] == 42
+    monkeypatch.setattr(Config, "LINK_REVOKED_USERS", {42})
+    with pytest.raises(LinkRejected, match="revoked"):
+        decode_link(token)
+
+
+def test_garbage_is_not_a_rejection():
+    with pytest.raises(ValueError) as error:
+        decode_link("_zzzz")
+    assert not isinstance(error.value, LinkRejected)
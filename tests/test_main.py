@@ -0,0 +1,59 @@
+import os
+import multiprocessing
+
+import pytest
+
+import main
+from config import Config
+
+
+@pytest.mark.parametrize("tokens, asked, started", [
+    (["a", "b", "c"], 4, 4),
+    (["a", "b", "c"], 8, 4),
+    (["a"], 3, 2),
+])
+def test_worker_processes_capped_at_bot_count(monkeypatch, tokens, asked, started):
+    monkeypatch.setattr(Config, "WORKER_BOTS", tokens)
+    monkeypatch.setattr(Config, "WORKER_PROCESSES", asked)
+    runs = []
+    monkeypatch.setattr(main, "run_processes", runs.append)
+    
+    main.main()
+    assert runs == [started]
+    # Every process owns at least one bot, so none sits on PORT answering 503
+    assert all(any(bot % started == node for bot in range(len(tokens) + 1)) for node in range(started))
+
+
+@pytest.mark.parametrize("mode, node_url, expected", [
+    ("proxy", None, "http://127.0.0.1:8081"),
+    ("proxy", "http://10.0.0.2:8000", "http://10.0.0.2:8081"),
+    ("redirect", "https://files.example.com", "http://files.example.com:8081"),
+])
+def test_process_node_urls(monkeypatch, mode, node_url, expected):
+    monkeypatch.setattr(Config, "PEER_MODE", mode)
+    monkeypatch.setattr(Config, "PORT", 8080)
+    monkeypatch.setattr(Config, "NODE_PORT", 0)
+    # run_processes sets the children's variables in this process's environment
+    monkeypatch.setattr(os, "environ", {"NODE_URL": node_url} if node_url else {})
+    started = []
+    
+    class Process:
+        def __init__(self, target, name):
+            pass
+        
+        def start(self):
+            started.append(os.environ["NODE_URL"])
+        
+        def join(self):
+            pass
+    
+    monkeypatch.setattr(multiprocessing.get_context("spawn"), "Process", Process)
+    main.run_processes(2)
+    assert started == [expected, expected.replace("8081", "8082")]
+
+
+def test_redirect_mode_needs_a_reachable_node_url(monkeypatch):
+    monkeypatch.setattr(Config, "PEER_MODE", "redirect")
+    monkeypatch.setattr(os, "environ", {})
+    monkeypatch.setattr(multiprocessing.get_context("spawn"), "Process", None)
+    assert main.run_processes(2) is None
@@ -0,0 +1,47 @@
+from fastapi.responses import Response
+
+import server
+from config import Config
+from peers import HashRing, PeerRouter
+from tests.conftest import UNIQUE_ID, link
+
+NODES = {0: {"url": "http://node0"}, 1: {"url": "http://node1"}, 2: {"url": "http://node2"}}
+
+
+def test_ring_is_stable_when_a_node_joins():
+    keys = [f"file-{i}" for i in range(1000)]
+    before = HashRing([0, 1, 2])
+    after = HashRing([0, 1, 2, 3])
+    moved = [key for key in keys if before.owner(key) != after.owner(key)]
+    assert all(after.owner(key) == 3 for key in moved)
+    assert len(moved) < 400
+
+
+def test_owner_url_is_none_on_the_owner(monkeypatch):
+    router = PeerRouter("proxy")
+    router.update(NODES)
+    owner = router.ring.owner(UNIQUE_ID)
+    monkeypatch.setattr(Config, "NODE_INDEX", owner)
+    assert router.owner_url(UNIQUE_ID) is None
+    monkeypatch.setattr(Config, "NODE_INDEX", (owner + 1) % len(NODES))
+    assert router.owner_url(UNIQUE_ID) == NODES[owner]["url"]
+
+
+def test_non_owner_forwards_without_lookup(client, telegram, monkeypatch):
+    router = PeerRouter("redirect")
+    router.update(NODES)
+    owner = router.ring.owner(UNIQUE_ID)
+    monkeypatch.setattr(Config, "NODE_INDEX", (owner + 1) % len(NODES))
+    monkeypatch.setattr(server, "peers", router)
+    forwarded = []
+    
+    async def forward(request, base_url, client_ip):
+        forwarded.append(base_url)
+        return Response(status_code=307, headers={"Location": base_url})
+    
+    monkeypatch.setattr(router, "forward", forward)
+    telegram.add(1)
+    response = client.get(link(1), follow_redirects=False)
+    assert response.status_code == 307
+    assert forwarded == [NODES[owner]["url"]]
+    assert telegram.get_messages == 0
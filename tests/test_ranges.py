@@ -0,0 +1,55 @@
+import pytest
+from fastapi import HTTPException
+
+from server import MAX_RANGES, parse_range_header
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", [(0, 99)]),
+    ("bytes=100-", [(100, 999)]),
+    ("bytes=-100", [(900, 999)]),
+    ("bytes=-5000", [(0, 999)]),
+    ("bytes=900-5000", [(900, 999)]),
+    ("bytes=0-99, 200-299", [(0, 99), (200, 299)]),
+    ("bytes=200-299,0-99", [(0, 99), (200, 299)]),
+    ("bytes=0-99,50-149", [(0, 149)]),
+    ("bytes=0-99,100-199", [(0, 199)]),
+    ("bytes=0-99,-100", [(0, 99), (900, 999)]),
+    ("bytes=500-,-600", [(400, 999)]),
+    ("bytes=0-99,5000-", [(0, 99)]),
+    ("BYTES = 0 - 9", [(0, 9)]),
+])
+def test_satisfiable(header, expected):
+    assert parse_range_header(header, SIZE) == expected
+
+
+@pytest.mark.parametrize("header", [
+    "",
+    "items=0-9",
+    "bytes=500-400",
+    "bytes=0-99,500-400",
+    "bytes=abc",
+    "bytes=-",
+    "bytes=1-2-3",
+    "bytes=",
+    "bytes=,",
+])
+def test_ignored(header):
+    assert parse_range_header(header, SIZE) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=-0", "bytes=1000-,2000-2999"])
+def test_unsatisfiable(header):
+    with pytest.raises(HTTPException) as error:
+        parse_range_header(header, SIZE)
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == f"bytes */{SIZE}"
+
+
+def test_too_many_ranges_sends_whole_file():
+    header = "bytes=" + ",".join(f"{i * 10}-{i * 10 + 1}" for i in range(MAX_RANGES + 1))
+    assert parse_range_header(header, SIZE) is None
+    header = "bytes=" + ",".join(f"{i * 10}-{i * 10 + 1}" for i in range(MAX_RANGES))
+    assert len(parse_range_header(header, SIZE)) == MAX_RANGES
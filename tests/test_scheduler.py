@@ -0,0 +1,40 @@
+import pytest
+
+import bot
+from scheduler import LeastLoadedScheduler, Scheduler, WeightedScheduler
+
+
+@pytest.fixture
+def workers():
+    for index in range(3):
+        bot.WorkerBots[index] = object()
+        bot.WorkLoads[index] = 0
+    yield
+    bot.WorkerBots.clear()
+    bot.WorkLoads.clear()
+
+
+def test_scheduler_without_score_fails_at_construction():
+    with pytest.raises(TypeError):
+        Scheduler()
+
+
+def test_least_loaded_picks_fewest_streams(workers):
+    bot.WorkLoads.update({0: 3, 1: 1, 2: 2})
+    assert LeastLoadedScheduler().rank() == [1, 2, 0]
+
+
+def test_cooldown_goes_last(workers):
+    scheduler = WeightedScheduler()
+    scheduler.cooldown(0, 30, "test")
+    assert scheduler.pick() != 0
+    assert scheduler.rank()[-1] == 0
+    assert scheduler.pick(exclude=[1, 2]) == 0
+
+
+def test_faster_worker_wins(workers):
+    scheduler = WeightedScheduler()
+    scheduler.record_fetch(0, 1024 * 1024, 1.0)
+    scheduler.record_fetch(1, 1024 * 1024, 0.1)
+    scheduler.record_fetch(2, 1024 * 1024, 0.5)
+    assert scheduler.rank() == [1, 2, 0]
@@ -0,0 +1,68 @@
+import ipaddress
+from types import SimpleNamespace
+
+import server
+from tests.conftest import DATA, SIZE, UNIQUE_ID, link
+
+
+def test_full_download(client, telegram):
+    telegram.add(1)
+    response = client.get(link(1))
+    assert response.status_code == 200
+    assert response.content == DATA
+
+
+def test_invalid_range_gets_whole_file(client, telegram):
+    telegram.add(1)
+    response = client.get(link(1), headers={"Range": "bytes=500-400"})
+    assert response.status_code == 200
+    assert response.content == DATA
+
+
+def test_multiple_ranges(client, telegram):
+    telegram.add(1)
+    response = client.get(link(1), headers={"Range": "bytes=0-9,-10"})
+    assert response.status_code == 206
+    assert response.headers["content-type"].startswith("multipart/byteranges")
+    assert len(response.content) == int(response.headers["content-length"])
+    assert DATA[:10] in response.content and DATA[-10:] in response.content
+
+
+def test_head_needs_no_lookup(client, telegram):
+    response = client.head(link(1))
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(SIZE)
+    assert telegram.get_messages == 0
+
+
+def test_revalidation_needs_no_lookup(client, telegram):
+    response = client.get(link(1), headers={"If-None-Match": f'"{UNIQUE_ID}"'})
+    assert response.status_code == 304
+    assert telegram.get_messages == 0
+
+
+def test_missing_message_is_404(client, telegram):
+    response = client.get(link(2))
+    assert response.status_code == 404
+    assert response.content != b"" and "content-range" not in response.headers
+
+
+def test_wrong_file_is_403(client, telegram):
+    telegram.add(3)
+    response = client.get(link(3, uid="AgADwrongFile"))
+    assert response.status_code == 403
+
+
+def test_real_ip_only_from_trusted_proxies(monkeypatch):
+    def request(host, real_ip=None):
+        headers = {"X-Real-IP": real_ip} if real_ip else {}
+        return SimpleNamespace(client=SimpleNamespace(host=host), headers=headers)
+    
+    server.is_trusted_proxy.cache_clear()
+    monkeypatch.setattr(server, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/8"), ipaddress.ip_network("::1")])
+    assert server.client_ip(request("10.1.2.3", "203.0.113.7")) == "203.0.113.7"
+    assert server.client_ip(request("::1", "203.0.113.7")) == "203.0.113.7"
+    assert server.client_ip(request("198.51.100.9", "203.0.113.7")) == "198.51.100.9"
+    assert server.client_ip(request("testclient", "203.0.113.7")) == "testclient"
+    assert server.client_ip(request("10.1.2.3")) == "10.1.2.3"
+    server.is_trusted_proxy.cache_clear()
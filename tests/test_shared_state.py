@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from shared_state import MemoryState, SharedState, SQLiteState
+
+
+def test_incomplete_backend_fails_at_construction():
+    class NoFiles(SharedState):
+        async def publish_node(self, node, info):
+            pass
+        
+        async def nodes(self):
+            return {}
+    
+    with pytest.raises(TypeError):
+        NoFiles()
+
+
+def test_memory_store_stays_bounded():
+    state = MemoryState(max_files=100)
+    
+    async def run():
+        for message_id in range(10000):
+            await state.set_file(f"chat:{message_id}", {"file_id": str(message_id)}, ttl=60)
+        assert len(state._files) == 100
+        assert await state.get_file("chat:0") is None
+        assert await state.get_file("chat:9999") == {"file_id": "9999"}
+    
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_round_trip(backend, tmp_path):
+    state = MemoryState() if backend == "memory" else SQLiteState(str(tmp_path / "state.db"))
+    
+    async def run():
+        await state.publish_node(1, {"workers": {"0": 2}, "url": "http://node1"})
+        assert (await state.nodes())[1]["url"] == "http://node1"
+        
+        await state.set_file("chat:1", {"file_id": "abc"}, ttl=60)
+        assert await state.get_file("chat:1") == {"file_id": "abc"}
+        await state.set_file("chat:2", {"file_id": "old"}, ttl=-1)
+        assert await state.get_file("chat:2") is None
+        assert await state.get_file("chat:3") is None
+    
+    asyncio.run(run())